@@ -0,0 +1,49 @@
+"""Generate the LALR table modules shipped for the built-in dialects.
+
+Invoked by ``setup.py build_py``. After changing a grammar in a source
+checkout, regenerate the tables by running::
+
+    python -m pycparserext._build_tables
+"""
+
+from __future__ import division
+
+import os
+import sys
+
+from pycparserext.ext_c_parser import GnuCParser, OpenCLCParser
+
+
+SHIPPED_PARSER_CLASSES = [GnuCParser, OpenCLCParser]
+
+# Protocol 2 keeps the modules loadable by every supported Python.
+PICKLE_PROTOCOL = 2
+
+
+def build_tables(outputdir=None):
+    if outputdir is None:
+        outputdir = os.path.dirname(os.path.abspath(__file__))
+
+    for parser_class in SHIPPED_PARSER_CLASSES:
+        # Stale shipped tables are rejected by fingerprint, so this
+        # regenerates them from the grammar whenever it has changed.
+        tables = parser_class(table_cache_dir="").parse_tables
+
+        filename = os.path.join(
+                outputdir, parser_class.yacctab.split(".")[-1] + ".py")
+        with open(filename, "w") as outf:
+            outf.write("# LALR tables for %s.\n" % parser_class.__name__)
+            outf.write("# Generated by pycparserext._build_tables, "
+                    "do not edit.\n\n")
+            outf.write("_grammar_fingerprint = %r\n"
+                    % parser_class.grammar_fingerprint())
+
+            data_literal = repr(tables.dumps(PICKLE_PROTOCOL))
+            if not data_literal.startswith("b"):
+                # Python 2 str, which must stay bytes under Python 3
+                data_literal = "b" + data_literal
+            outf.write("_tables = %s\n" % data_literal)
+
+
+if __name__ == "__main__":
+    build_tables(*sys.argv[1:])
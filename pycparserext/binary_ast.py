@@ -0,0 +1,470 @@
+"""A binary format for ASTs that loads faster than :mod:`pickle`.
+
+:func:`dumps` and :func:`dump` take any node of :mod:`pycparser.c_ast` or
+:mod:`pycparserext.ext_c_parser`, including the compact nodes of
+:mod:`pycparserext.compact_ast`, and :func:`loads` and :func:`load` give
+back an equal tree::
+
+    from pycparserext import binary_ast
+
+    data = binary_ast.dumps(ast)
+    ast = binary_ast.loads(data)
+
+Nodes and lists are numbered level by level. Nodes are stored by kind (a
+small integer for their class and attribute names), as one array per
+attribute holding the index of the value of that attribute in each node
+of the kind. Lists are stored as arrays of the indices of their items.
+Strings and other constants are stored once each and referred to by
+negative indices, and coordinates as a table of their files, lines and
+columns. All of that is written with :mod:`marshal`, which handles flat
+lists of integers and strings much faster than :mod:`pickle` handles
+objects. Both directions work on whole arrays at a time, with the cyclic
+garbage collector paused.
+
+Loading takes a third of the time of :func:`pickle.loads` or less.
+Saving is faster than :func:`pickle.dumps` on Python 2 and for compact
+nodes. For regular nodes on Python 3, it takes about twice as long as
+the C pickler.
+
+Shared nodes, lists and coordinates stay shared. Lazy coordinates are
+loaded as regular ones. Attribute values besides nodes, lists and
+coordinates must be :mod:`marshal`-able. Like pickles, the data is not
+portable between Python 2 and 3, and should only be loaded from trusted
+sources.
+"""
+
+from __future__ import division
+
+import gc
+import sys
+import marshal
+from array import array
+from contextlib import contextmanager
+from functools import partial
+from importlib import import_module
+from itertools import chain, groupby, islice, repeat
+from operator import attrgetter, itemgetter, ne
+
+try:
+    from itertools import filterfalse
+except ImportError:
+    from itertools import ifilterfalse as filterfalse
+    from future_builtins import map, zip
+
+import pycparser.c_ast as c_ast
+from pycparser.plyparser import Coord
+
+from pycparserext.ext_c_parser import LazyCoord
+from pycparserext.compact_ast import CompactNode, compact_class
+
+
+MAGIC = b"PCXA"
+FORMAT_VERSION = 1
+
+# codes of attribute value types
+_NONE, _NODE, _LIST, _COORD, _STR, _OTHER = range(6)
+
+# maps types of attribute values to their codes
+_VALUE_CODES = {type(None): _NONE, list: _LIST, str: _STR, Coord: _COORD}
+
+
+def _value_code(value_type):
+    try:
+        return _VALUE_CODES[value_type]
+    except KeyError:
+        pass
+
+    # Compact classes are not actual subclasses of Node.
+    if issubclass(value_type, (c_ast.Node, CompactNode)):
+        code = _NODE
+    elif issubclass(value_type, LazyCoord):
+        code = _COORD
+    else:
+        code = _OTHER
+
+    _VALUE_CODES[value_type] = code
+    return code
+
+
+def _column_code(values):
+    """Return the code of the types of *values* other than *None*, or
+    *None* if they are of more than one.
+    """
+    codes = set(map(_value_code, set(map(type, values))))
+    codes.discard(_NONE)
+    if not codes:
+        return _NONE
+    if len(codes) == 1:
+        return codes.pop()
+    return None
+
+
+_coord_getter = attrgetter("file", "line", "column")
+
+_NONE_ID = id(None)
+
+
+def _is_not_none(value):
+    return value is not None
+
+
+def _pack(indices):
+    result = array("i", indices)
+    try:
+        return result.tobytes()
+    except AttributeError:
+        return result.tostring()
+
+
+def _unpack(data, byteorder):
+    result = array("i")
+    try:
+        result.frombytes(data)
+    except AttributeError:
+        result.fromstring(data)
+    if byteorder != sys.byteorder:
+        result.byteswap()
+    return result
+
+
+@contextmanager
+def _gc_paused():
+    # Saving and loading allocate many containers, none of them garbage,
+    # and each collection would go through the whole tree.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+# {{{ saving
+
+class _Refs(dict):
+    """Maps constants to their (negative) indices, adding those missing."""
+
+    def __init__(self, consts):
+        dict.__init__(self)
+        self.consts = consts
+
+    def __missing__(self, key):
+        self.consts.append(key)
+        ref = self[key] = -len(self.consts)
+        return ref
+
+
+class _Kinds(dict):
+    """Maps (node type, attribute names) to kinds, adding those missing."""
+
+    def __init__(self):
+        dict.__init__(self)
+        # kind zero is for lists
+        self.entries = [None]
+
+    def __missing__(self, key):
+        node_type, names = key
+        compact = issubclass(node_type, CompactNode)
+        if compact:
+            node_type = node_type._node_class
+        kind = self[key] = len(self.entries)
+        self.entries.append(
+                (node_type.__module__, node_type.__name__, compact, names))
+        return kind
+
+
+def _node_dict(node):
+    try:
+        return vars(node)
+    except TypeError:
+        # compact nodes
+        return None
+
+
+def _kind_key(node, fields):
+    node_type = type(node)
+    if fields is None:
+        return (node_type, tuple(
+            name for name in node_type.__slots__ if hasattr(node, name)))
+    return (node_type, tuple(fields))
+
+
+class _Writer(object):
+    def __init__(self):
+        self.nitems = 0
+        # nodes waiting for their attributes to be stored, and their indices
+        self.frontier = []
+        self.frontier_refs = []
+
+        self.consts = [None]
+        self.const_refs = _Refs(self.consts)
+        self.const_refs[None] = -1
+        # constants that compare equal across types, like 1 and True
+        self.typed_refs = {}
+
+        # maps id() of nodes, lists and coordinates to their indices
+        self.object_refs = {_NONE_ID: -1}
+
+        self.kinds = _Kinds()
+        # (kind, node indices, one array of value indices per attribute)
+        self.node_groups = []
+        # (list indices, lengths, item indices)
+        self.list_groups = []
+
+        # the coordinates, and the indices of the constants they stand for
+        self.coords = []
+        self.coord_refs = []
+
+    def object_refs_for(self, values, code):
+        """Return the indices of the nodes, lists or coordinates *values*,
+        registering those new to the writer.
+        """
+        object_refs = self.object_refs
+        ids = list(map(id, values))
+
+        # Most often, all values other than None are distinct and new.
+        nnones = ids.count(_NONE_ID)
+        if nnones:
+            new_ids = list(filter(partial(ne, _NONE_ID), ids))
+        else:
+            new_ids = ids
+        all_new = (len(set(new_ids)) == len(new_ids)
+                and not any(map(object_refs.__contains__, new_ids)))
+        if all_new:
+            if nnones:
+                new_values = list(filter(_is_not_none, values))
+            else:
+                new_values = values
+        else:
+            new_ids = list(filterfalse(object_refs.__contains__,
+                dict.fromkeys(ids)))
+            new_values = list(map(dict(zip(ids, values)).__getitem__, new_ids))
+
+        if code == _COORD:
+            start = -len(self.consts) - 1
+            new_refs = range(start, start - len(new_ids), -1)
+            self.coord_refs.extend(new_refs)
+            self.consts.extend(repeat(None, len(new_ids)))
+            self.coords.extend(new_values)
+        else:
+            new_refs = range(self.nitems, self.nitems + len(new_ids))
+            self.nitems += len(new_ids)
+            if code == _NODE:
+                self.frontier.extend(new_values)
+                self.frontier_refs.extend(new_refs)
+            else:
+                self.add_lists(new_values, new_refs)
+        object_refs.update(zip(new_ids, new_refs))
+
+        if all_new and not nnones:
+            return list(new_refs)
+        return list(map(object_refs.__getitem__, ids))
+
+    def refs(self, values):
+        """Return the indices of *values*, registering those new to the
+        writer.
+        """
+        code = _column_code(values)
+        if code == _NONE:
+            return [-1] * len(values)
+        if code == _STR:
+            return list(map(self.const_refs.__getitem__, values))
+        if code is None or code == _OTHER:
+            return [self.refs([value])[0] if _value_code(type(value)) != _OTHER
+                    else self.other_ref(value) for value in values]
+        return self.object_refs_for(values, code)
+
+    def other_ref(self, value):
+        if value is None:
+            return -1
+        try:
+            return self.typed_refs[type(value), value]
+        except KeyError:
+            self.consts.append(value)
+            ref = self.typed_refs[type(value), value] = -len(self.consts)
+            return ref
+        except TypeError:
+            # unhashable
+            self.consts.append(value)
+            return -len(self.consts)
+
+    def add_lists(self, lists, list_refs):
+        self.list_groups.append((
+            _pack(list_refs),
+            _pack(list(map(len, lists))),
+            _pack(self.refs(list(chain.from_iterable(lists))))))
+
+    def add_nodes(self, nodes, node_refs):
+        try:
+            dicts = list(map(vars, nodes))
+        except TypeError:
+            # Some are compact nodes, which have no __dict__.
+            dicts = list(map(_node_dict, nodes))
+            keys = list(map(_kind_key, nodes, dicts))
+        else:
+            keys = list(zip(map(type, nodes), map(tuple, dicts)))
+
+        kinds = list(map(self.kinds.__getitem__, keys))
+        order = sorted(range(len(nodes)), key=kinds.__getitem__)
+        for kind, group in groupby(order, kinds.__getitem__):
+            group = list(group)
+            names = keys[group[0]][1]
+
+            if not names:
+                rows = [()] * len(group)
+            elif dicts[group[0]] is None:
+                rows = list(map(attrgetter(*names),
+                    map(nodes.__getitem__, group)))
+            else:
+                rows = list(map(itemgetter(*names),
+                    map(dicts.__getitem__, group)))
+            if len(names) == 1:
+                rows = [(row,) for row in rows]
+
+            self.node_groups.append((kind,
+                _pack(map(node_refs.__getitem__, group)),
+                [_pack(self.refs(list(column))) for column in zip(*rows)]))
+
+    def write(self, node):
+        if _value_code(type(node)) != _NODE:
+            raise TypeError("expected a node, got %r" % type(node))
+        self.refs([node])
+
+        while self.frontier:
+            nodes, node_refs = self.frontier, self.frontier_refs
+            self.frontier, self.frontier_refs = [], []
+            self.add_nodes(nodes, node_refs)
+
+        coord_table = ()
+        if self.coords:
+            files, lines, columns = zip(*map(_coord_getter, self.coords))
+            coord_table = (_pack(self.refs(list(files))), _pack(lines),
+                    list(columns))
+
+        return MAGIC + marshal.dumps((FORMAT_VERSION, sys.byteorder,
+            self.kinds.entries, self.nitems, self.node_groups,
+            self.list_groups, self.consts, _pack(self.coord_refs),
+            coord_table))
+
+
+def dumps(node):
+    """Return the binary representation of the tree under *node* as
+    :class:`bytes`.
+    """
+    with _gc_paused():
+        return _Writer().write(node)
+
+
+def dump(node, outf):
+    """Write the binary representation of the tree under *node* to the
+    binary file *outf*.
+    """
+    outf.write(dumps(node))
+
+# }}}
+
+
+# {{{ loading
+
+def _node_class(module_name, class_name):
+    node_class = getattr(import_module(module_name), class_name, None)
+    if not (isinstance(node_class, type)
+            and issubclass(node_class, c_ast.Node)):
+        raise ValueError("not a node class: %s.%s"
+                % (module_name, class_name))
+    return node_class
+
+
+def _new_objects(cls, n):
+    return list(map(object.__new__, repeat(cls, n)))
+
+
+def _set_attributes(objects, names, columns):
+    for name, column in zip(names, columns):
+        for _ in map(setattr, objects, repeat(name), column):
+            pass
+
+
+def loads(data):
+    """Return the tree stored in *data*, as written by :func:`dumps`."""
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("not a binary AST")
+    try:
+        contents = marshal.loads(data[len(MAGIC):])
+    except (ValueError, TypeError, EOFError):
+        raise ValueError("corrupt binary AST")
+    if contents[0] != FORMAT_VERSION:
+        raise ValueError("unsupported binary AST format version %r"
+                % contents[0])
+
+    with _gc_paused():
+        return _read(*contents[1:])
+
+
+def _read(byteorder, kind_entries, nitems, node_groups, list_groups, consts,
+        coord_refs, coord_table):
+    kinds = [None]
+    for module_name, class_name, compact, names in kind_entries[1:]:
+        node_class = _node_class(module_name, class_name)
+        if compact:
+            node_class = compact_class(node_class)
+        kinds.append((node_class, names))
+
+    # Items are all made first, so that they can refer to each other in
+    # any order.
+    items = [None] * nitems
+    set_item = items.__setitem__
+    node_groups = [(kind, _unpack(node_refs, byteorder),
+        [_unpack(column, byteorder) for column in columns])
+        for kind, node_refs, columns in node_groups]
+    list_groups = [[_unpack(indices, byteorder) for indices in group]
+            for group in list_groups]
+
+    group_objects = []
+    for kind, node_refs, columns in node_groups:
+        nodes = _new_objects(kinds[kind][0], len(node_refs))
+        for _ in map(set_item, node_refs, nodes):
+            pass
+        group_objects.append(nodes)
+    for list_refs, lengths, item_refs in list_groups:
+        lists = [[] for _ in list_refs]
+        for _ in map(set_item, list_refs, lists):
+            pass
+        group_objects.append(lists)
+
+    table = items + consts[::-1]
+    get = table.__getitem__
+
+    coord_refs = _unpack(coord_refs, byteorder)
+    if coord_refs:
+        file_refs, lines, columns = coord_table
+        coords = _new_objects(Coord, len(coord_refs))
+        _set_attributes(coords, ("file", "line", "column"), [
+            map(get, _unpack(file_refs, byteorder)),
+            _unpack(lines, byteorder), columns])
+        for _ in map(table.__setitem__, coord_refs, coords):
+            pass
+
+    for (kind, node_refs, columns), nodes in zip(node_groups, group_objects):
+        _set_attributes(nodes, kinds[kind][1],
+                [map(get, column) for column in columns])
+
+    for (list_refs, lengths, item_refs), lists in zip(
+            list_groups, group_objects[len(node_groups):]):
+        values = map(get, item_refs)
+        for _ in map(list.extend, lists, map(islice, repeat(values), lengths)):
+            pass
+
+    return items[0]
+
+
+def load(inf):
+    """Return the tree stored in the binary file *inf*, as written by
+    :func:`dump`.
+    """
+    return loads(inf.read())
+
+# }}}
+
+# vim: fdm=marker
@@ -1,4 +1,6 @@
-# keep this file the same as the CGenerator upstream
+# keep this file the same as the CGenerator upstream, except for taking the
+# class of nodes from n.__class__, which compact nodes set to the class they
+# stand in for
 
 from pycparser import c_ast
 
@@ -276,7 +278,7 @@ class CGenerator(object):
             for individual visit_* methods to handle different treatment of
             some statements in this context.
         """
-        typ = type(n)
+        typ = n.__class__
         if add_indent: self.indent_level += 2
         indent = self._make_indent()
         if add_indent: self.indent_level -= 2
@@ -313,7 +315,7 @@ class CGenerator(object):
             encountered on the way down to a TypeDecl, to allow proper
             generation from it.
         """
-        typ = type(n)
+        typ = n.__class__
         #~ print(n, modifiers)
 
         if typ == c_ast.TypeDecl:
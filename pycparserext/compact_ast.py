@@ -0,0 +1,171 @@
+"""Compact AST nodes.
+
+The nodes of :mod:`pycparser.c_ast` and the extension nodes of
+:mod:`pycparserext.ext_c_parser` keep their attributes in a per-instance
+``__dict__``. :func:`compact` converts a tree to nodes of equivalent
+classes with ``__slots__``, which take about half the memory. A parser
+given it as *node_factory* converts each external declaration as soon as
+it has been parsed::
+
+    from pycparserext.ext_c_parser import GnuCParser
+    from pycparserext.compact_ast import compact
+
+    parser = GnuCParser(node_factory=compact)
+
+Compact nodes have the attributes and methods of the nodes they replace,
+and give the class of those as their ``__class__``. So ``isinstance``
+checks, and visitors that dispatch on class names, such as the generators
+in this package, treat both alike. Only ``type(node)`` tells them apart.
+Compact nodes cannot take attributes besides their fields. They pickle
+as compact nodes.
+"""
+
+from __future__ import division
+
+import copy
+
+try:
+    from inspect import getfullargspec as getargspec
+except ImportError:
+    from inspect import getargspec
+
+import pycparser.c_ast as c_ast
+
+
+# fields set by the parser besides those of the constructor
+_EXTRA_FIELDS = {
+        c_ast.TypeDecl: ("attributes",),
+        c_ast.Typename: ("name",),
+        }
+
+# maps node classes to their compact classes
+_COMPACT_CLASSES = {}
+
+
+class CompactNode(object):
+    """Base class of the compact node classes."""
+
+    __slots__ = ()
+
+    # set in each subclass: the class this one stands in for
+    _node_class = None
+
+    def __reduce__(self):
+        return (_make_compact_node, (self._node_class, tuple(
+            (name, getattr(self, name)) for name in self.__slots__
+            if hasattr(self, name))))
+
+    def __reduce_ex__(self, protocol):
+        # Python 2 looks for __reduce__ on the spoofed __class__
+        return self.__reduce__()
+
+
+def _make_compact_node(node_class, fields):
+    node = object.__new__(compact_class(node_class))
+    for name, value in fields:
+        setattr(node, name, value)
+    return node
+
+
+def _function(cls, name):
+    # unbound methods check the class of self on Python 2
+    method = getattr(cls, name)
+    return getattr(method, "__func__", method)
+
+
+def compact_class(node_class):
+    """Return the compact class for the :class:`pycparser.c_ast.Node`
+    subclass *node_class*.
+    """
+    try:
+        return _COMPACT_CLASSES[node_class]
+    except KeyError:
+        pass
+
+    init = _function(node_class, "__init__")
+
+    # Subclasses such as SkippedCompound also set the fields of their base.
+    fields = []
+    for cls in node_class.__mro__:
+        if issubclass(cls, c_ast.Node) and "__init__" in cls.__dict__:
+            fields.extend(name
+                    for name in getargspec(_function(cls, "__init__")).args[1:]
+                    + list(_EXTRA_FIELDS.get(cls, ()))
+                    if name not in fields)
+
+    result = _COMPACT_CLASSES[node_class] = type(
+            node_class.__name__, (CompactNode,), {
+                "__slots__": tuple(fields),
+                "_fields": frozenset(fields),
+                "__module__": __name__,
+                "__doc__": node_class.__doc__,
+                "__init__": init,
+                "__class__": property(lambda self: node_class),
+                "_node_class": node_class,
+                "children": _function(node_class, "children"),
+                "show": _function(node_class, "show"),
+                "attr_names": node_class.attr_names,
+                })
+    return result
+
+
+# maps types to whether they are regular node classes
+_PLAIN_NODE_TYPES = {}
+
+
+def _is_plain_node(value):
+    value_type = type(value)
+    try:
+        return _PLAIN_NODE_TYPES[value_type]
+    except KeyError:
+        # Compact classes are not actual subclasses.
+        result = _PLAIN_NODE_TYPES[value_type] = issubclass(
+                value_type, c_ast.Node)
+        return result
+
+
+def compact(node):
+    """Return a copy of the tree under *node* made of compact nodes.
+
+    Nodes with attributes besides their fields are copied as they are, but
+    with compact children. Nodes that are shared within the tree are
+    shared in the copy.
+    """
+    if not _is_plain_node(node):
+        return node
+
+    # maps id() of the nodes of the tree to their copies
+    copies = {}
+    nodes = []
+
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if id(node) in copies:
+            continue
+
+        fields = node.__dict__
+        compact_node_class = compact_class(type(node))
+        if compact_node_class._fields.issuperset(fields):
+            copies[id(node)] = object.__new__(compact_node_class)
+        else:
+            copies[id(node)] = copy.copy(node)
+        nodes.append(node)
+
+        for value in fields.values():
+            if type(value) is list:
+                stack.extend(item for item in value if _is_plain_node(item))
+            elif _is_plain_node(value):
+                stack.append(value)
+
+    for node in nodes:
+        node_copy = copies[id(node)]
+        for name, value in node.__dict__.items():
+            if type(value) is list:
+                value = [copies[id(item)] if _is_plain_node(item) else item
+                        for item in value]
+            elif _is_plain_node(value):
+                value = copies[id(value)]
+            setattr(node_copy, name, value)
+
+    return copies[id(nodes[0])]
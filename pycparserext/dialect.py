@@ -0,0 +1,156 @@
+"""Composing C dialects from grammar mixins.
+
+:func:`make_dialect` builds a parser class, and the matching lexer class,
+from a list of grammar mixins and extra keywords::
+
+    from pycparserext.dialect import make_dialect
+    from pycparserext.ext_c_parser import (
+            _OpenCLMixin, _GnuMixin, _AttributesMixin, _AsmAndAttributesMixin)
+
+    GnuCNoAsmParser = make_dialect("GnuCNoAsmParser",
+            [_GnuMixin, _AttributesMixin])
+    MyCLParser = make_dialect("MyCLParser",
+            [MyCLMixin, _OpenCLMixin, _AsmAndAttributesMixin],
+            keywords=["__device__"])
+
+A mixin may define
+
+* ``p_*`` grammar rules, as in :mod:`pycparserext.ext_c_parser`,
+* ``lexer_keywords``, the keywords its rules use (as token ``KEYWORD``
+  for keyword ``keyword``),
+* ``lexer_rules``, a lexer class whose token rules (but not keywords) it
+  needs, such as :class:`~pycparserext.ext_c_lexer.OpenCLCLexer` for
+  comment and preprocessor tokens,
+* ``initial_type_symbols``, the typedef names it predefines.
+
+The lexer gets exactly the keywords of the mixins and *keywords*, so that
+no token goes unused by the grammar. With
+:class:`~pycparserext.ext_c_parser._AttributesMixin` but not
+:class:`~pycparserext.ext_c_parser._AsmAndAttributesMixin`, the dialect
+also takes attributes after function declarators, giving
+:class:`~pycparserext.ext_c_parser.FuncDeclExt` nodes as GNU C does.
+
+Dialects are memoized: the same arguments return the same class. Their
+LALR tables are shared by all dialects with the same grammar fingerprint
+in a process, and cached on disk like those of the built-in parsers. A
+dialect with the grammar of a built-in parser uses its shipped tables.
+"""
+
+from __future__ import division
+
+import threading
+
+from pycparser.c_lexer import CLexer as CLexerBase
+
+from pycparserext.ext_c_lexer import _BuildCacheMixin, add_lexer_keywords
+from pycparserext.ext_c_parser import (CParserBase, _AttributesMixin,
+        _AsmAndAttributesMixin, _AttributedDeclaratorsMixin)
+
+
+_lock = threading.Lock()
+
+# maps the arguments of make_dialect to the parser class
+_DIALECTS = {}
+
+# maps grammar fingerprint to parse tables
+_TABLES = {}
+
+
+class _DialectParserBase(CParserBase):
+    def _load_parse_tables(self, yacc_debug, table_cache_dir):
+        if yacc_debug or table_cache_dir == "":
+            return CParserBase._load_parse_tables(
+                    self, yacc_debug, table_cache_dir)
+
+        fingerprint = type(self)._fingerprint
+        with _lock:
+            tables = _TABLES.get(fingerprint)
+
+        if tables is None:
+            tables = CParserBase._load_parse_tables(
+                    self, yacc_debug, table_cache_dir)
+            with _lock:
+                tables = _TABLES.setdefault(fingerprint, tables)
+
+        return tables
+
+
+def _make_lexer_class(name, rules_class, keywords):
+    # Start from the token rules of rules_class, but with only the keywords
+    # of plain C.
+    rules_keywords = set(rules_class.keywords) - set(CLexerBase.keywords)
+    lexer_class = type(name, (rules_class,), dict(
+        keywords=CLexerBase.keywords,
+        keyword_map=CLexerBase.keyword_map,
+        tokens=tuple(tok for tok in rules_class.tokens
+            if tok not in rules_keywords)))
+
+    add_lexer_keywords(lexer_class, keywords)
+    return lexer_class
+
+
+def make_dialect(name, mixins, keywords=(), initial_type_symbols=()):
+    """Return a subclass of
+    :class:`~pycparserext.ext_c_parser.CParserBase` named *name* with the
+    grammar *mixins* as bases, in this order.
+
+    :arg keywords: keywords to add to those of the *mixins*.
+    :arg initial_type_symbols: typedef names to add to those of the
+        *mixins*.
+    """
+    key = (name, tuple(mixins), tuple(keywords),
+            frozenset(initial_type_symbols))
+
+    with _lock:
+        try:
+            return _DIALECTS[key]
+        except KeyError:
+            pass
+
+    bases = tuple(mixins)
+    if (any(issubclass(mixin, _AttributesMixin) for mixin in bases)
+            and not any(issubclass(mixin, _AsmAndAttributesMixin)
+                for mixin in bases)):
+        # Without asm, attributes still follow function declarators.
+        bases += (_AttributedDeclaratorsMixin,)
+    parser_class = type(name, bases + (_DialectParserBase,), {})
+
+    all_keywords = []
+    all_type_symbols = set(initial_type_symbols)
+    rules_class = None
+
+    # bases first, matching the token order of the built-in parsers
+    for base in reversed(parser_class.__mro__):
+        all_keywords.extend(kw
+                for kw in base.__dict__.get("lexer_keywords", ())
+                if kw not in all_keywords)
+        all_type_symbols.update(base.__dict__.get("initial_type_symbols", ()))
+
+        base_rules_class = base.__dict__.get("lexer_rules")
+        if base_rules_class is None:
+            continue
+        if rules_class is None or issubclass(base_rules_class, rules_class):
+            rules_class = base_rules_class
+        elif not issubclass(rules_class, base_rules_class):
+            raise ValueError("mixins need conflicting lexers %s and %s"
+                    % (rules_class.__name__, base_rules_class.__name__))
+
+    all_keywords.extend(kw for kw in keywords if kw not in all_keywords)
+
+    if rules_class is None:
+        rules_class = type("CLexer", (_BuildCacheMixin, CLexerBase), {})
+
+    parser_class.lexer_class = _make_lexer_class(
+            name + "Lexer", rules_class, all_keywords)
+    parser_class.initial_type_symbols = frozenset(all_type_symbols)
+    parser_class._fingerprint = parser_class.grammar_fingerprint()
+
+    from pycparserext._build_tables import SHIPPED_PARSER_CLASSES
+    for shipped_class in SHIPPED_PARSER_CLASSES:
+        if shipped_class.grammar_fingerprint() == parser_class._fingerprint:
+            parser_class.yacctab = shipped_class.yacctab
+
+    with _lock:
+        return _DIALECTS.setdefault(key, parser_class)
+
+# vim: fdm=marker
@@ -1,5 +1,6 @@
 from pycparserext.c_generator import CGenerator as CGeneratorBaseBuggy
 from pycparserext.ext_c_parser import FuncDeclExt
+from pycparserext.walk import iter_child_nodes
 import pycparser.c_ast as c_ast
 
 
@@ -7,6 +8,13 @@ import pycparser.c_ast as c_ast
 
 
 class CGeneratorBase(CGeneratorBaseBuggy):
+    def generic_visit(self, node):
+        # without building the (name, child) pairs of children()
+        if node is None:
+            return ''
+        else:
+            return ''.join(self.visit(c) for c in iter_child_nodes(node))
+
     # bug fix
     def visit_UnaryOp(self, n):
         operand = self._parenthesize_unless_simple(n.expr)
@@ -25,6 +33,10 @@ class CGeneratorBase(CGeneratorBaseBuggy):
             else:
                 return '%s%s' % (n.op, operand)
 
+    def visit_SkippedCompound(self, n):
+        # The statements of the body were not parsed.
+        return self.visit_Compound(n)
+
 
 
 
@@ -54,7 +66,7 @@ class AsmAndAttributesMixin(object):
             encountered on the way down to a TypeDecl, to allow proper
             generation from it.
         """
-        typ = type(n)
+        typ = n.__class__
         #~ print(n, modifiers)
 
         if typ == c_ast.TypeDecl:
@@ -1,10 +1,251 @@
+import re
+from array import array
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
 from pycparser.c_lexer import CLexer as CLexerBase
-from ply.lex import TOKEN
+from ply.lex import TOKEN, LexToken
+
+
+
+
+# maps (lexer class, keywords) to a built PLY lexer
+_BUILT_LEXERS = {}
+
+_GROUP_START_RE = re.compile(r"\s*\(")
+_GROUP_SCAN_RE = re.compile(
+        r"""[()]|"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*'""")
+
+
+def _compact_array(ints):
+    """Return an :class:`array.array` of the non-negative *ints* with the
+    smallest item size that holds them.
+    """
+    top = max(ints) if ints else 0
+    for typecode in "BHIL":
+        if top < 1 << (8 * array(typecode).itemsize):
+            return array(typecode, ints)
+    raise OverflowError("integer too large for an array")
+
+
+class TokenStream(object):
+    """The tokens of a source, stored compactly, as returned by
+    :meth:`GNUCLexer.token_stream` and :meth:`OpenCLCLexer.token_stream`.
+
+    Identifiers are stored unclassified and become ``TYPEID`` tokens while
+    being parsed, so one stream may be parsed with different initial type
+    symbols.
+
+    .. attribute:: filename
+
+        The file name the source was lexed with.
+
+    .. attribute:: type_names
+
+        The token types of the lexer. :attr:`types` holds indices into it.
+
+    .. attribute:: types
+    .. attribute:: values
+
+        Indices into :attr:`strings`, which holds each distinct token value
+        (and file name) once.
+
+    .. attribute:: line_table
+
+        Flattened ``(token index, line number, file name index)`` triples
+        for the tokens at which the line or the file name changes, ending
+        with one for the state of the lexer after the last token.
+    """
+
+    # bump when the serialized format changes
+    _format_version = 1
+
+    def __init__(self, filename, type_names, types, values, strings,
+            line_table):
+        self.filename = filename
+        self.type_names = tuple(type_names)
+        self.types = types
+        self.values = values
+        self.strings = strings
+        self.line_table = line_table
+
+    def __len__(self):
+        return len(self.types)
+
+    def dumps(self, protocol=pickle.HIGHEST_PROTOCOL):
+        return pickle.dumps((self._format_version, self.filename,
+            self.type_names, self.types, self.values, self.strings,
+            self.line_table), protocol)
+
+    @classmethod
+    def loads(cls, data):
+        data = pickle.loads(data)
+        if data[0] != cls._format_version:
+            raise ValueError("unsupported token stream format version %d"
+                    % data[0])
+        return cls(*data[1:])
+
+    def iter_tokens(self, clex):
+        """Generate the tokens as :class:`ply.lex.LexToken` instances, with
+        identifiers classified by the *type_lookup_func* of the lexer
+        *clex* at the time they are generated. The file name of *clex* is
+        kept up to date as the lexer would have, and the *lexpos* of each
+        token is its index in the stream.
+        """
+        type_names = self.type_names
+        strings = self.strings
+        line_table = self.line_table
+        type_lookup_func = clex.type_lookup_func
+        id_index = type_names.index("ID")
+
+        line_index = 0
+        next_line_change = line_table[0]
+        lineno = None
+
+        for i, (tok_type, value) in enumerate(zip(self.types, self.values)):
+            if i == next_line_change:
+                lineno = line_table[line_index + 1]
+                clex.filename = strings[line_table[line_index + 2]]
+                line_index += 3
+                next_line_change = line_table[line_index]
+
+            tok = LexToken()
+            tok.value = value = strings[value]
+            if tok_type == id_index and type_lookup_func(value):
+                tok.type = "TYPEID"
+            else:
+                tok.type = type_names[tok_type]
+            tok.lineno = lineno
+            tok.lexpos = i
+            clex.last_token = tok
+            yield tok
+
+        clex.filename = strings[line_table[-1]]
+        clex.last_token = None
+
+
+class _BuildCacheMixin(object):
+    def build(self, **kwargs):
+        """Build the PLY lexer. Without *kwargs*, the compiled lexer
+        specification is shared among all instances of a lexer class with
+        the same keywords, making all but the first build nearly free.
+        """
+        if kwargs:
+            return CLexerBase.build(self, **kwargs)
+
+        key = (type(self), self.keywords)
+        try:
+            prototype = _BUILT_LEXERS[key]
+        except KeyError:
+            # Bind the prototype to an instance of its own rather than to
+            # self, to avoid keeping self (and its parser) alive.
+            proto_clex = type(self)(error_func=None, type_lookup_func=None)
+            CLexerBase.build(proto_clex)
+            prototype = _BUILT_LEXERS[key] = proto_clex.lexer
+
+        self.lexer = clone_lexer(prototype, self)
+
+    def _unclassified_tokens(self):
+        type_lookup_func = self.type_lookup_func
+        self.type_lookup_func = lambda name: False
+        try:
+            while True:
+                # not self.token, which a parser may have wrapped
+                tok = type(self).token(self)
+                if tok is None:
+                    return
+                yield tok
+        finally:
+            self.type_lookup_func = type_lookup_func
+
+    def tokenize(self, text):
+        """Return the list of tokens of *text*, as :meth:`token` would
+        return them after ``input(text)``, except that identifiers are not
+        classified: all of them have type ``ID``, since whether a name is a
+        typedef name depends on the declarations parsed before it.
+        """
+        self.input(text)
+        self.reset_lineno()
+        return list(self._unclassified_tokens())
+
+    def token_stream(self, text, filename=''):
+        """Lex *text* into a :class:`TokenStream`, which
+        :meth:`pycparserext.ext_c_parser.CParserBase.parse_tokens` parses
+        without lexing again.
+        """
+        self.input(text)
+        self.reset_lineno()
+        self.filename = filename
+        self.lexer.begin("INITIAL")
+
+        type_indices = dict(
+                (tok_type, i) for i, tok_type in enumerate(self.tokens))
+        string_indices = {}
+
+        def intern_string(s):
+            try:
+                return string_indices[s]
+            except KeyError:
+                result = string_indices[s] = len(string_indices)
+                return result
+
+        types = []
+        values = []
+        line_table = []
+        line = None
+
+        for i, tok in enumerate(self._unclassified_tokens()):
+            types.append(type_indices[tok.type])
+            values.append(intern_string(tok.value))
+
+            tok_line = (tok.lineno, self.filename)
+            if tok_line != line:
+                line = tok_line
+                line_table.extend((i, tok.lineno, intern_string(self.filename)))
+
+        # The lexer may have crossed a #line directive after the last token.
+        line_table.extend(
+                (len(types), self.lexer.lineno, intern_string(self.filename)))
+
+        strings = [None] * len(string_indices)
+        for s, i in string_indices.items():
+            strings[i] = s
 
+        return TokenStream(filename, self.tokens, _compact_array(types),
+                _compact_array(values), strings, _compact_array(line_table))
 
+    def skip_parentheses(self):
+        """If the input continues with a parenthesized group, move past it
+        without lexing it and return the offsets ``(start, end)`` of its
+        contents in the input. Otherwise, return *None*.
+        """
+        lexer = self.lexer
+        text = lexer.lexdata
+        m = _GROUP_START_RE.match(text, lexer.lexpos)
+        if m is None:
+            return None
 
+        start = m.end()
+        depth = 1
+        for m in _GROUP_SCAN_RE.finditer(text, start):
+            if m.group() == "(":
+                depth += 1
+            elif m.group() == ")":
+                depth -= 1
+                if not depth:
+                    break
+        else:
+            return None
 
-class GNUCLexer(CLexerBase):
+        lexer.lineno += text.count("\n", lexer.lexpos, m.end())
+        lexer.lexpos = m.end()
+        return start, m.start()
+
+
+class GNUCLexer(_BuildCacheMixin, CLexerBase):
     # support '3i' for imaginary literal
     floating_constant = '(((('+CLexerBase.fractional_constant+')'+CLexerBase.exponent_part+'?)|([0-9]+'+CLexerBase.exponent_part+'))i?[FfLl]?)'
 
@@ -13,7 +254,7 @@ class GNUCLexer(CLexerBase):
         return t
 
 
-class OpenCLCLexer(CLexerBase):
+class OpenCLCLexer(_BuildCacheMixin, CLexerBase):
     tokens = CLexerBase.tokens + ('LINECOMMENT',)
     states = (
             #('comment', 'exclusive'),
@@ -31,6 +272,254 @@ class OpenCLCLexer(CLexerBase):
         t.lexer.lineno += t.value.count("\n")
         return t
 
+    # {{{ fast scanner
+
+    def input(self, text):
+        CLexerBase.input(self, text)
+        self._scanner = None
+
+    def token(self):
+        scanner = getattr(self, "_scanner", None)
+        if scanner is None:
+            if not _has_opencl_rules(type(self)):
+                return CLexerBase.token(self)
+            scanner = self._scanner = self._scan(
+                    self.lexer.lexpos, self.lexer.lineno)
+
+        self.last_token = next(scanner, None)
+        return self.last_token
+
+    def skip_parentheses(self):
+        result = _BuildCacheMixin.skip_parentheses(self)
+        if result is not None:
+            # restart from the new position
+            self._scanner = None
+        return result
+
+    def _unclassified_tokens(self):
+        if not _has_opencl_rules(type(self)):
+            return _BuildCacheMixin._unclassified_tokens(self)
+        return self._scan(self.lexer.lexpos, self.lexer.lineno, classify=False)
+
+    def _scan(self, pos, lineno, classify=True):
+        """Generate the tokens of the input from *pos* on, matching the
+        rules of the PLY lexer with a single regular expression. Errors and
+        anything unusual are handed to the PLY lexer, one token at a time.
+        """
+        lexer = self.lexer
+        text = lexer.lexdata
+        end = len(text)
+        match = _FAST_SCAN_RE.match
+        keyword_map = self.keyword_map
+        type_lookup_func = self.type_lookup_func
+
+        while pos < end:
+            m = match(text, pos)
+            kind = m.lastgroup if m is not None else None
+
+            if kind == "ws":
+                pos = m.end()
+                continue
+            if kind == "NEWLINE":
+                new_pos = m.end()
+                lineno += new_pos - pos
+                pos = new_pos
+                continue
+            if kind == "LINECOMMENT":
+                pos = m.end()
+                lineno += 1
+                continue
+
+            if kind == "ID":
+                value = m.group()
+                tok_type = keyword_map.get(value, "ID")
+                if (classify and tok_type == "ID"
+                        and type_lookup_func(value)):
+                    tok_type = "TYPEID"
+            elif kind == "op":
+                value = m.group()
+                tok_type = _FAST_SCAN_OPS[value]
+            elif kind is not None and kind not in _FAST_SCAN_FALLBACK:
+                value = m.group()
+                tok_type = kind
+            else:
+                lexer.lexpos = pos
+                lexer.lineno = lineno
+                tok = lexer.token()
+                if tok is None:
+                    return
+                if not classify and tok.type == "TYPEID":
+                    tok.type = "ID"
+                pos = lexer.lexpos
+                lineno = lexer.lineno
+                yield tok
+                continue
+
+            tok = LexToken()
+            tok.type = tok_type
+            tok.value = value
+            tok.lineno = lineno
+            tok.lexpos = pos
+
+            pos = m.end()
+            if kind == "PPHASH":
+                lineno += value.count("\n")
+
+            lexer.lexpos = pos
+            lexer.lineno = lineno
+            yield tok
+
+        # like PLY
+        lexer.lexpos = pos + 1
+        lexer.lineno = lineno
+
+    # }}}
+
+
+
+# {{{ fast scanner for OpenCLCLexer
+
+def _uncapture(regex):
+    """Turn the capturing groups of *regex* into non-capturing ones."""
+    result = []
+    i = 0
+    in_class = False
+    while i < len(regex):
+        c = regex[i]
+        if c == "\\":
+            c = regex[i:i+2]
+        elif in_class:
+            in_class = c != "]"
+        elif c == "[":
+            in_class = True
+            # a "]" right after "[" or "[^" is a member of the class
+            for prefix in ("[^]", "[]", "[^"):
+                if regex.startswith(prefix, i):
+                    c = prefix
+                    break
+        elif c == "(" and not regex.startswith("?", i+1):
+            c = "(?:"
+        result.append(c)
+        i += len(regex[i]) if c == "(?:" else len(c)
+    return "".join(result)
+
+
+def _make_fast_scan_re():
+    # The alternatives are tried in the same order as the rules of the PLY
+    # lexer, except that rules that cannot match the same first character
+    # are moved around to try the frequent ones first.
+    rules = [
+            ("ws", r"[ \t]+"),
+            ("NEWLINE", r"\n+"),
+            ("WCHAR_CONST", CLexerBase.wchar_const),
+            ("WSTRING_LITERAL", CLexerBase.wstring_literal),
+            ("ID", CLexerBase.identifier),
+            ("LINECOMMENT", OpenCLCLexer.t_LINECOMMENT.__doc__),
+            # PLY skips the blanks of t_ignore before matching
+            ("PPHASH", OpenCLCLexer.t_PPHASH.__doc__.replace("[ \t]*", "", 1)),
+            ("FLOAT_CONST", CLexerBase.floating_constant),
+            ("HEX_FLOAT_CONST", CLexerBase.hex_floating_constant),
+            ("INT_CONST_HEX", CLexerBase.hex_constant),
+            ("BAD_CONST_OCT", CLexerBase.bad_octal_constant),
+            ("INT_CONST_OCT", CLexerBase.octal_constant),
+            ("INT_CONST_DEC", CLexerBase.decimal_constant),
+            ("CHAR_CONST", CLexerBase.char_const),
+            ("UNMATCHED_QUOTE", CLexerBase.unmatched_quote),
+            ("BAD_CHAR_CONST", CLexerBase.bad_char_const),
+            ("BAD_STRING_LITERAL", CLexerBase.bad_string_literal),
+            ]
+
+    # PLY sorts the string rules by decreasing length of their regex.
+    str_rules = sorted(
+            (name[2:], getattr(CLexerBase, name))
+            for name in dir(CLexerBase)
+            if name.startswith("t_") and not name.startswith("t_ppline_")
+            and name != "t_ignore"
+            and isinstance(getattr(CLexerBase, name), str))
+    str_rules.sort(key=lambda rule: len(rule[1]), reverse=True)
+
+    ops = {}
+    op_regexes = []
+    for tok_type, regex in str_rules:
+        if tok_type == "STRING_LITERAL":
+            rules.append((tok_type, regex))
+        else:
+            ops[re.sub(r"\\(.)", r"\1", regex)] = tok_type
+            op_regexes.append(regex)
+    rules.append(("op", "|".join(op_regexes)))
+
+    return re.compile("|".join(
+        "(?P<%s>%s)" % (name, _uncapture(regex))
+        for name, regex in rules)), ops
+
+
+_FAST_SCAN_RE, _FAST_SCAN_OPS = _make_fast_scan_re()
+
+# token kinds left to the PLY lexer, which reports the error
+_FAST_SCAN_FALLBACK = frozenset([
+    "BAD_CONST_OCT", "UNMATCHED_QUOTE", "BAD_CHAR_CONST",
+    "BAD_STRING_LITERAL"])
+
+
+def _has_opencl_rules(cls):
+    """Tell whether the lexer class *cls* has the token rules of
+    :class:`OpenCLCLexer`, which the fast scanner implements.
+    """
+    try:
+        return _RULES_CHECKED[cls]
+    except KeyError:
+        pass
+
+    def rules(c):
+        return dict(
+                (name, getattr(getattr(c, name), "__func__",
+                    getattr(c, name)))
+                for name in dir(c) if name.startswith("t_"))
+
+    result = _RULES_CHECKED[cls] = (
+            rules(cls) == rules(OpenCLCLexer)
+            and cls.states == OpenCLCLexer.states)
+    return result
+
+
+_RULES_CHECKED = {}
+
+# }}}
+
+
+def clone_lexer(lexer, obj):
+    """Return a copy of the built PLY *lexer* whose rule functions are bound
+    to the lexer object *obj*.
+
+    Replaces :meth:`ply.lex.Lexer.clone`, which (as of PLY 3.11) keeps only
+    the last master regex of each state when rebinding.
+    """
+    from copy import copy
+    result = copy(lexer)
+
+    def rebind(func):
+        return getattr(obj, func.__name__)
+
+    result.lexstatere = dict(
+            (state, [
+                (regex, [
+                    (rebind(func_info[0]), func_info[1])
+                    if func_info and func_info[0] else func_info
+                    for func_info in func_index])
+                for regex, func_index in state_res])
+            for state, state_res in lexer.lexstatere.items())
+    result.lexstateerrorf = dict(
+            (state, rebind(func))
+            for state, func in lexer.lexstateerrorf.items())
+    result.lexstateeoff = dict(
+            (state, rebind(func))
+            for state, func in lexer.lexstateeoff.items())
+    result.lexmodule = obj
+    result.lexstatestack = []
+    result.begin("INITIAL")
+
+    return result
+
 
 
 
@@ -45,16 +534,21 @@ def add_lexer_keywords(cls, keywords):
     cls.tokens = cls.tokens + tuple(
             kw.upper() for kw in keywords)
 
-add_lexer_keywords(GNUCLexer, [
-    '__attribute__', '__asm__', '__asm', '__typeof__',
+_ATTRIBUTE_KEYWORDS = ['__attribute__']
+_ASM_KEYWORDS = ['__asm__', '__asm']
+_GNU_KEYWORDS = [
+    '__typeof__',
     '__real__', '__imag__', '__builtin_types_compatible_p',
     '__const', '__restrict', '__inline', '__inline__',
-    '__extension__'])
+    '__extension__']
 
 _CL_KEYWORDS = ['kernel', 'constant', 'global', 'local', 'private',
         "read_only", "write_only", "read_write"]
-add_lexer_keywords(OpenCLCLexer, [
-    '__attribute__', '__asm__', '__asm']
-    + _CL_KEYWORDS + ["__"+kw for kw in _CL_KEYWORDS])
+_OPENCL_KEYWORDS = _CL_KEYWORDS + ["__"+kw for kw in _CL_KEYWORDS]
+
+add_lexer_keywords(GNUCLexer,
+        _ATTRIBUTE_KEYWORDS + _ASM_KEYWORDS + _GNU_KEYWORDS)
+add_lexer_keywords(OpenCLCLexer,
+        _ATTRIBUTE_KEYWORDS + _ASM_KEYWORDS + _OPENCL_KEYWORDS)
 
 # vim: fdm=marker
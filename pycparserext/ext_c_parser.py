@@ -1,9 +1,761 @@
 from __future__ import division
 
+import io
+import os
+import re
+import sys
+import mmap
+import codecs
+import hashlib
+from array import array
+from bisect import bisect_right
+from functools import partial
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+try:
+    import copyreg
+except ImportError:
+    import copy_reg as copyreg
+
 import pycparser.c_parser
 import pycparser.c_ast as c_ast
+from pycparser.plyparser import Coord, ParseError
 import ply.yacc
+from ply.lex import LexToken
+
+from pycparserext.walk import walk
+
+
+# {{{ parse table cache
+
+def get_table_cache_dir():
+    """Return the directory in which generated LALR tables are cached.
+
+    Uses ``$PYCPARSEREXT_CACHE_DIR`` if set (an empty value disables the
+    cache), otherwise ``$XDG_CACHE_HOME/pycparserext``.
+    """
+    result = os.environ.get("PYCPARSEREXT_CACHE_DIR")
+    if result is not None:
+        return result
+
+    cache_home = os.environ.get("XDG_CACHE_HOME",
+            os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(cache_home, "pycparserext")
+
+
+class _ParseTables(object):
+    """The part of a generated LALR automaton that does not depend on the
+    parser instance it is bound to.
+    """
+
+    def __init__(self, action, goto, productions):
+        self.action = action
+        self.goto = goto
+        # (str, name, len, func, file, line), as in PLY's table modules
+        self.productions = productions
+
+    @classmethod
+    def from_lr_parser(cls, lr_parser):
+        return cls(lr_parser.action, lr_parser.goto, [
+            (prod.str, prod.name, prod.len, prod.func, prod.file, prod.line)
+            for prod in lr_parser.productions])
+
+    def dumps(self, protocol=pickle.HIGHEST_PROTOCOL):
+        return pickle.dumps(
+                (self.action, self.goto, self.productions), protocol)
+
+    @classmethod
+    def loads(cls, data):
+        action, goto, productions = pickle.loads(data)
+        return cls(action, goto, productions)
+
+    def make_lr_parser(self, module):
+        lr = ply.yacc.LRTable()
+        lr.lr_method = "LALR"
+        lr.lr_action = self.action
+        lr.lr_goto = self.goto
+        lr.lr_productions = [
+                ply.yacc.MiniProduction(*prod) for prod in self.productions]
+        lr.bind_callables(dict(
+            (prod.func, getattr(module, prod.func))
+            for prod in lr.lr_productions if prod.func))
+
+        return ply.yacc.LRParser(lr, module.p_error)
+
+
+def _read_table_module(module_name, fingerprint):
+    try:
+        __import__(module_name)
+    except ImportError:
+        return None
+
+    tab_module = sys.modules[module_name]
+    if getattr(tab_module, "_grammar_fingerprint", None) != fingerprint:
+        return None
+
+    try:
+        return _ParseTables.loads(tab_module._tables)
+    except Exception:
+        # written by an incompatible Python: fall back to the cache
+        return None
+
+
+def _read_table_cache(filename):
+    try:
+        with open(filename, "rb") as inf:
+            return _ParseTables.loads(inf.read())
+    except Exception:
+        # missing, truncated or unreadable: regenerate
+        return None
+
+
+# os.rename fails on Windows if the target exists. Python 2 only has that.
+_replace_file = getattr(os, "replace", os.rename)
+
+
+def _write_cache_file(filename, data):
+    from tempfile import mkstemp
+
+    dirname = os.path.dirname(filename)
+    tmp_filename = None
+    try:
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+
+        # write-then-rename, so that concurrent readers never see a partial
+        # file
+        fd, tmp_filename = mkstemp(dir=dirname, suffix=".tmp")
+        with os.fdopen(fd, "wb") as outf:
+            outf.write(data)
+        _replace_file(tmp_filename, filename)
+    except (IOError, OSError):
+        # The cache is only an optimization.
+        if tmp_filename is not None:
+            try:
+                os.unlink(tmp_filename)
+            except OSError:
+                pass
+
+
+def _write_table_cache(filename, tables):
+    _write_cache_file(filename, tables.dumps())
+
+# }}}
+
+
+# {{{ file input
+
+_CR_NEWLINE_RE = re.compile(r"\r\n?")
+
+
+def _read_mapped_file(path, encoding):
+    with open(path, "rb") as inf:
+        try:
+            mapping = mmap.mmap(inf.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files cannot be mapped
+            return ""
+
+    try:
+        if bytes is str:
+            # Python 2 parses byte strings, as read from files.
+            text = mapping[:]
+        else:
+            text = codecs.decode(mapping, encoding)
+    finally:
+        mapping.close()
+
+    # Translate line endings in one pass, making one more copy at most.
+    if "\r" in text:
+        if bytes is str:
+            text = _CR_NEWLINE_RE.sub("\n", text)
+        else:
+            text = io.IncrementalNewlineDecoder(None, translate=True).decode(
+                    text, final=True)
+
+    return text
+
+# }}}
+
+
+# {{{ streaming LR driver
+
+def _iter_translation_units(lr_parser, clex, error_func, allow_empty=False,
+        next_type=None):
+    """Run *lr_parser* on the input of the :class:`pycparser.c_lexer.CLexer`
+    *clex*, yielding ``(value, boundary)`` for every ``translation_unit``
+    reduction as it happens.
+
+    *boundary* is the ``(lexpos, lineno, filename, next_type)`` state of
+    the lexer just after the last token of the external declarations
+    reduced, from which parsing can be resumed. If the parser has already
+    read the token after them and it is an identifier, *next_type* is its
+    type (``ID`` or ``TYPEID``), else *None*. The closing brace of a
+    function body is reduced only after that token has been read, so it may
+    have been classified as a typedef name from the body's scope. Passing
+    *next_type* when resuming reproduces that.
+
+    This is the loop of PLY's :meth:`ply.yacc.LRParser.parse`, without
+    position tracking and error recovery (the C grammar has no ``error``
+    rules, and :meth:`CParserBase.p_error` raises), turned into a generator.
+    With *allow_empty*, input without any tokens yields nothing instead of
+    being a syntax error.
+    """
+    actions = lr_parser.action
+    goto = lr_parser.goto
+    productions = lr_parser.productions
+    defaulted_states = lr_parser.defaulted_states
+
+    pslice = ply.yacc.YaccProduction(None)
+    pslice.lexer = clex
+    pslice.parser = lr_parser
+
+    end_sym = ply.yacc.YaccSymbol()
+    end_sym.type = "$end"
+
+    statestack = [0]
+    symstack = [end_sym]
+    pslice.stack = symstack
+    state = 0
+    lookahead = None
+    last_token = None
+    # file name before the last token was read, which may have crossed a
+    # #line directive
+    filename = clex.filename
+
+    while True:
+        if state in defaulted_states:
+            t = defaulted_states[state]
+        else:
+            if lookahead is None:
+                filename = clex.filename
+                lookahead = clex.token() or end_sym
+                if last_token is None:
+                    if allow_empty and lookahead is end_sym:
+                        return
+                    if next_type is not None \
+                            and lookahead.type in ("ID", "TYPEID"):
+                        lookahead.type = next_type
+            t = actions[state].get(lookahead.type)
+
+        if t is None:
+            error_func(None if lookahead is end_sym else lookahead)
+            raise ParseError("unexpected input")
+
+        if t > 0:
+            statestack.append(t)
+            symstack.append(lookahead)
+            state = t
+            last_token = lookahead
+            lookahead = None
+
+        elif t < 0:
+            prod = productions[-t]
+            plen = prod.len
+
+            sym = ply.yacc.YaccSymbol()
+            sym.type = prod.name
+            sym.value = None
+
+            if plen:
+                targ = symstack[-plen-1:]
+                targ[0] = sym
+                del symstack[-plen:]
+                del statestack[-plen:]
+            else:
+                targ = [sym]
+
+            pslice.slice = targ
+            lr_parser.state = state
+            prod.callable(pslice)
+
+            symstack.append(sym)
+            state = goto[statestack[-1]][prod.name]
+            statestack.append(state)
+
+            if prod.name == "translation_unit":
+                yield sym.value, (
+                        last_token.lexpos + len(last_token.value),
+                        last_token.lineno + last_token.value.count("\n"),
+                        clex.filename if lookahead is None else filename,
+                        lookahead.type if lookahead is not None
+                        and lookahead.type in ("ID", "TYPEID") else None)
+
+        else:
+            return
+
+
+def _has_coord_in_file(nodes, filename):
+    for root in nodes:
+        for node in walk(root):
+            coord = getattr(node, "coord", None)
+            if coord is not None and coord.file == filename:
+                return True
+    return False
+
+# }}}
+
+
+# {{{ lazy coordinates
+
+class _LineTable(object):
+    """Maps the positions that tokens carry in place of line numbers with
+    ``coord_mode="lazy"`` to file names, lines and columns.
+
+    A position is the index of the token in the source plus one, so that
+    zero keeps meaning "no line". The table has an entry for the first
+    token of each line.
+    """
+
+    def __init__(self):
+        self.positions = array("L")
+        self.lines = array("L")
+        # offset of the start of the line, if the source text is known
+        self.line_starts = array("L")
+        self.file_indices = array("L")
+        self.files = []
+        self.has_columns = True
+
+        self.last_line = None
+        self.last_file = None
+
+        # Coordinates are positions, and find this table through their
+        # class, so that they take no more memory than an int.
+        self.coord_class = type("LazyCoord", (LazyCoord,),
+                dict(__slots__=(), _table=self))
+
+    def add(self, pos, line, filename, text):
+        self.positions.append(pos)
+        self.lines.append(line)
+
+        if text is None:
+            self.has_columns = False
+            self.line_starts.append(0)
+        else:
+            self.line_starts.append(text.rfind("\n", 0, pos - 1) + 1)
+
+        if filename != self.last_file:
+            try:
+                file_index = self.files.index(filename)
+            except ValueError:
+                file_index = len(self.files)
+                self.files.append(filename)
+            self.last_file = filename
+        else:
+            file_index = self.file_indices[-1]
+        self.file_indices.append(file_index)
+
+        self.last_line = line
+
+    def resolve(self, pos):
+        i = bisect_right(self.positions, pos) - 1
+        column = None
+        if self.has_columns:
+            column = pos - self.line_starts[i]
+        return (self.files[self.file_indices[i]], self.lines[i], column)
+
+
+def _positioned_tokens(get_token, clex, table, text_getter):
+    """Wrap the token function *get_token* to replace the line number of
+    each token by its position, recording lines in *table*.
+    """
+    def token():
+        tok = get_token()
+        if tok is None:
+            return None
 
+        pos = tok.lexpos + 1
+        if tok.lineno != table.last_line or clex.filename != table.last_file:
+            table.add(pos, tok.lineno, clex.filename, text_getter())
+        tok.lineno = pos
+        return tok
+
+    return token
+
+
+class LazyCoord(int):
+    """Stands in for a :class:`pycparser.plyparser.Coord` with
+    ``coord_mode="lazy"``. It is just the position of a token, as an
+    integer. Its :attr:`file`, :attr:`line` and :attr:`column` are looked
+    up in the line table of its parse when accessed, and :meth:`resolve`
+    returns an actual :class:`~pycparser.plyparser.Coord`. Pickles as a
+    :class:`~pycparser.plyparser.Coord`.
+    """
+
+    __slots__ = ()
+
+    # set in the subclass made for each parse by _LineTable
+    _table = None
+
+    @property
+    def file(self):
+        return self._table.resolve(self)[0]
+
+    @property
+    def line(self):
+        return self._table.resolve(self)[1]
+
+    @property
+    def column(self):
+        return self._table.resolve(self)[2]
+
+    def resolve(self):
+        return Coord(*self._table.resolve(self))
+
+    def __str__(self):
+        return str(self.resolve())
+
+    def __repr__(self):
+        return "LazyCoord(%s)" % self
+
+    def __reduce__(self):
+        return (Coord, self._table.resolve(self))
+
+# }}}
+
+
+# {{{ attribute filtering
+
+_FILTERED_TOKEN_TYPES = frozenset(["__ATTRIBUTE__", "__ASM__", "__ASM"])
+
+# characters that tokens adjacent to each other must not both have at their
+# ends, lest they run together
+_WORD_CHARS = frozenset(
+        "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_.'\"")
+_OPERATOR_CHARS = frozenset("+-*/%&|^<>=!:#")
+
+
+def _join_token_values(values):
+    """Return the source text of the tokens with *values*, with a space
+    after commas and between tokens that would otherwise run together.
+    """
+    result = []
+    last = None
+    for value in values:
+        if last is not None and (last == ","
+                or (last[-1] in _WORD_CHARS and value[0] in _WORD_CHARS)
+                or (last[-1] in _OPERATOR_CHARS
+                    and value[0] in _OPERATOR_CHARS)):
+            result.append(" ")
+        result.append(value)
+        last = value
+    return "".join(result)
+
+
+def _filtered_tokens(get_token, attribute_mode, clex=None):
+    """Wrap the token function *get_token* to consume
+    ``__attribute__((...))`` and ``__asm__(...)`` with their arguments.
+    With *attribute_mode* ``"strip"``, they are dropped. With ``"raw"``,
+    the arguments are passed on as a single ``ID`` token holding their
+    text.
+
+    If *get_token* reads from the lexer *clex*, the arguments are skipped
+    in its input without being lexed, and their text is as in the source.
+    Otherwise, as for a :class:`~pycparserext.ext_c_lexer.TokenStream`,
+    which does not keep white space, it is rebuilt from the tokens by
+    :func:`_join_token_values`.
+    """
+    # tokens to return before reading on, last first
+    pending = []
+
+    def read_text():
+        span = clex.skip_parentheses()
+        if span is None:
+            return None
+        start, end = span
+        return clex.lexer.lexdata[start:end]
+
+    def read_tokens():
+        group = []
+        depth = 0
+        while True:
+            tok = get_token()
+            if tok is None or (not group and tok.type != "LPAREN"):
+                pending.extend(reversed(group))
+                if tok is not None:
+                    pending.append(tok)
+                return None
+
+            group.append(tok)
+            if tok.type == "LPAREN":
+                depth += 1
+            elif tok.type == "RPAREN":
+                depth -= 1
+                if not depth:
+                    return _join_token_values(t.value for t in group[1:-1])
+
+    read_group = read_tokens if clex is None else read_text
+
+    def make_token(tok_type, value, keyword):
+        tok = LexToken()
+        tok.type = tok_type
+        tok.value = value
+        tok.lineno = keyword.lineno
+        tok.lexpos = keyword.lexpos
+        return tok
+
+    def token():
+        while True:
+            if pending:
+                return pending.pop()
+
+            tok = get_token()
+            if tok is None or tok.type not in _FILTERED_TOKEN_TYPES:
+                return tok
+
+            value = read_group()
+            if value is None:
+                return tok
+            if attribute_mode == "strip":
+                continue
+
+            # attributes have two pairs of parentheses
+            value = value.strip()
+            parens = 1
+            if (tok.type == "__ATTRIBUTE__"
+                    and value.startswith("(") and value.endswith(")")):
+                value = value[1:-1].strip()
+                parens = 2
+
+            pending.extend(
+                    [make_token("RPAREN", ")", tok) for i in range(parens)]
+                    + [make_token("ID", value, tok)]
+                    + [make_token("LPAREN", "(", tok) for i in range(parens)])
+            return tok
+
+    return token
+
+# }}}
+
+
+# {{{ typedef scopes
+
+class TypedefScopeStack(object):
+    """The typedef names in scope during a parse, in a stack of block
+    scopes on top of the file scope. Looking up a name takes constant time
+    at any depth.
+
+    :arg bases: a sequence of sets of names that are in file scope from the
+        start. They are used without being copied.
+    """
+
+    # Snapshots merge all bases but the first beyond this many.
+    max_bases = 4
+
+    def __init__(self, bases=()):
+        self.bases = tuple(bases)
+
+        # maps names declared in open scopes to the number of those
+        # scopes that declare them
+        self._counts = {}
+        # the names declared in each open scope, file scope first
+        self._scopes = [set()]
+
+        self._snapshot = None
+
+    def __contains__(self, name):
+        if name in self._counts:
+            return True
+        for base in self.bases:
+            if name in base:
+                return True
+        return False
+
+    def __len__(self):
+        return len(self._scopes)
+
+    def push(self):
+        self._scopes.append(set())
+
+    def pop(self):
+        assert len(self._scopes) > 1
+        scope = self._scopes.pop()
+        if scope:
+            counts = self._counts
+            for name in scope:
+                if counts[name] == 1:
+                    del counts[name]
+                else:
+                    counts[name] -= 1
+            self._snapshot = None
+
+    def add(self, name):
+        scope = self._scopes[-1]
+        if name not in scope:
+            scope.add(name)
+            self._counts[name] = self._counts.get(name, 0) + 1
+            self._snapshot = None
+
+    def snapshot(self):
+        """Return the names in scope as a tuple of sets. Passing it as
+        *bases* restores them, all in file scope. Snapshots taken while no
+        names are declared are the same object.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            declared = frozenset(self._counts)
+            if not declared:
+                snapshot = self.bases
+            elif len(self.bases) < self.max_bases:
+                snapshot = self.bases + (declared,)
+            else:
+                snapshot = (self.bases[0], declared.union(*self.bases[1:]))
+            self._snapshot = snapshot
+        return snapshot
+
+    def names(self):
+        """Return a :class:`frozenset` of the names in scope."""
+        return frozenset().union(*self.snapshot())
+
+# }}}
+
+
+# {{{ subtree sharing
+
+def _shared_strings(get_token, strings):
+    setdefault = strings.setdefault
+
+    def token():
+        tok = get_token()
+        if tok is not None:
+            tok.value = setdefault(tok.value, tok.value)
+        return tok
+
+    return token
+
+
+class _SharedSubtrees(object):
+    """The subtrees and strings that a parser made with
+    ``share_subtrees=True`` shares between the declarations of one parse.
+    """
+
+    def __init__(self):
+        self.strings = {}
+        # maps keys of shared subtrees to them
+        self.nodes = {}
+        # id() of the shared nodes and lists, which *nodes* keeps alive
+        self.ids = set()
+
+    def key(self, node):
+        """Return a key that equal subtrees have in common, or *None* if
+        *node* is not a subtree that can be shared.
+        """
+        node_type = type(node)
+        if node_type is c_ast.IdentifierType:
+            if node.coord is None:
+                return (node_type, tuple(node.names))
+
+        elif node_type is c_ast.TypeDecl:
+            # Named ones carry the declarator's coordinates.
+            if (node.declname is None and node.coord is None
+                    and type(node.type) is c_ast.IdentifierType):
+                attributes = getattr(node, "attributes", None)
+                attributes_key = None
+                if attributes is not None:
+                    attributes_key = self.key(attributes)
+                    if attributes_key is None:
+                        return None
+                return (node_type, tuple(node.quals or ()),
+                        self.key(node.type), attributes_key)
+
+        # The rest only occurs in attribute lists, which lose their
+        # coordinates when shared.
+        elif node_type is c_ast.ID:
+            return (node_type, node.name)
+
+        elif node_type is c_ast.Constant:
+            return (node_type, node.type, node.value)
+
+        elif node_type is c_ast.ExprList:
+            keys = tuple(self.key(expr) for expr in node.exprs)
+            if None not in keys:
+                return (node_type, keys)
+
+        elif node_type is c_ast.FuncCall:
+            name_key = self.key(node.name)
+            args_key = None
+            if node.args is not None:
+                args_key = self.key(node.args)
+                if args_key is None:
+                    return None
+            if name_key is not None:
+                return (node_type, name_key, args_key)
+
+        return None
+
+    def share(self, node):
+        """Return the shared subtree equal to *node*, which becomes that
+        if there is none yet. Return *node* if it cannot be shared.
+        """
+        key = self.key(node)
+        if key is None:
+            return node
+
+        try:
+            return self.nodes[key]
+        except KeyError:
+            pass
+
+        ids = self.ids
+        node_type = type(node)
+        if node_type is c_ast.IdentifierType:
+            ids.add(id(node.names))
+        elif node_type is c_ast.TypeDecl:
+            node.type = self.share(node.type)
+            if getattr(node, "attributes", None) is not None:
+                node.attributes = self.share(node.attributes)
+            if node.quals is not None:
+                ids.add(id(node.quals))
+        else:
+            node.coord = None
+            if node_type is c_ast.ExprList:
+                node.exprs[:] = [self.share(expr) for expr in node.exprs]
+                ids.add(id(node.exprs))
+            elif node_type is c_ast.FuncCall:
+                node.name = self.share(node.name)
+                if node.args is not None:
+                    node.args = self.share(node.args)
+
+        ids.add(id(node))
+        self.nodes[key] = node
+        return node
+
+# }}}
+
+
+# {{{ preludes
+
+class Prelude(object):
+    """The state after parsing a header prelude shared by many sources,
+    from which :meth:`CParserBase.parse` can resume, like a compiler does
+    from a precompiled header. Made by :meth:`CParserBase.parse_prelude`.
+    Preludes can be pickled.
+
+    .. attribute:: ext
+
+        The external declarations of the prelude, as a tuple.
+
+    .. attribute:: type_symbols
+
+        A :class:`frozenset` of the typedef names in file scope at the end
+        of the prelude.
+
+    .. attribute:: key
+
+        A hex digest identifying the source of the prelude and the parser
+        class.
+    """
+
+    def __init__(self, ext, type_symbols, key):
+        self.ext = tuple(ext)
+        self.type_symbols = frozenset(type_symbols)
+        self.key = key
+
+# }}}
 
 
 class CParserBase(pycparser.c_parser.CParser):
@@ -23,7 +775,67 @@ class CParserBase(pycparser.c_parser.CParser):
         'struct_declarator_list'
     ]
 
-    def __init__(self, yacc_debug=False):
+    initial_type_symbols = frozenset()
+
+    # Name of a table module generated by :mod:`pycparserext._build_tables`.
+    # It is only used if its fingerprint matches the grammar, so subclasses
+    # that change the grammar fall back to the table cache.
+    yacctab = None
+
+    # Names of rules whose results are shared with ``share_subtrees=True``.
+    _shared_rules = ()
+
+    def __init__(self, yacc_debug=False, table_cache_dir=None, tables=None,
+            parse_cache=None, coord_mode="eager", skip_function_bodies=False,
+            attribute_mode="parse", node_factory=None, share_subtrees=False):
+        """
+        :arg table_cache_dir: directory in which to cache the generated LALR
+            tables. Defaults to :func:`get_table_cache_dir`. Pass an empty
+            string to always generate the tables from the grammar.
+        :arg tables: the :attr:`parse_tables` of another instance of this
+            class, to be shared instead of loaded.
+        :arg parse_cache: a :class:`pycparserext.parse_cache.ParseCache`
+            through which :meth:`parse` memoizes its results.
+        :arg coord_mode: how nodes get their ``coord``. ``"eager"``
+            creates a :class:`pycparser.plyparser.Coord` for each one.
+            ``"lazy"`` gives them a :class:`LazyCoord` instead, which
+            takes less memory and also knows the column. ``"none"`` sets
+            all of them to *None*, which is fastest. Error messages keep
+            their line numbers in all modes.
+        :arg skip_function_bodies: if *True*, the bodies of function
+            definitions are not parsed, only matched brace for brace, and
+            become :class:`SkippedCompound` nodes. This is much faster for
+            code of which only the declarations are of interest.
+        :arg attribute_mode: how ``__attribute__((...))`` and
+            ``__asm__(...)`` are handled, in dialects that have them.
+            ``"parse"`` parses their arguments as expressions. ``"raw"``
+            skips over the arguments in the lexer and keeps their source
+            text as the name of a single :class:`pycparser.c_ast.ID`.
+            When parsing a :class:`~pycparserext.ext_c_lexer.TokenStream`,
+            which does not keep white space, that text has a space only
+            after commas and between tokens that would otherwise run
+            together, as in ``format(printf, 1, 2)``.
+            ``"strip"`` drops them altogether.
+        :arg node_factory: a function called with each external
+            declaration once it has been parsed, which returns the node to
+            put in the AST instead, such as
+            :func:`pycparserext.compact_ast.compact`.
+        :arg share_subtrees: if *True*, subtrees that many declarations
+            have in common are made once and shared by all of them, within
+            each parse (each source, for :meth:`parse_many`): the
+            :class:`pycparser.c_ast.IdentifierType` of each spelling of a
+            type, with its ``names`` list, unnamed
+            :class:`pycparser.c_ast.TypeDecl` nodes of such types, as in
+            ``int *``, and lists of attributes, which then have no
+            coordinates. Equal token strings are also shared. The trees
+            are otherwise the same. Shared nodes and lists must not be
+            modified: callers that change the tree should replace them in
+            their parent with a copy instead, see :meth:`is_shared`. With
+            a *node_factory*, sharing only holds within each declaration.
+
+        See :mod:`pycparserext.registry` for a way to share *tables* across
+        a process.
+        """
         self.clex = self.lexer_class(
             error_func=self._lex_error_func,
             type_lookup_func=self._lex_type_lookup_func)
@@ -34,25 +846,575 @@ class CParserBase(pycparser.c_parser.CParser):
         for rule in self.OPT_RULES:
             self._create_opt_rule(rule)
 
-        self.cparser = ply.yacc.yacc(
+        if tables is None:
+            tables = self._load_parse_tables(yacc_debug, table_cache_dir)
+        self.parse_tables = tables
+
+        self.skip_function_bodies = skip_function_bodies
+        if skip_function_bodies:
+            # The LR parser looks rule functions up on the instance, so this
+            # does not change the grammar.
+            self.p_brace_open = self._p_brace_open_skipping
+            self.p_compound_statement_1 = self._p_compound_statement_skipping
+
+        self.node_factory = node_factory
+        if node_factory is not None:
+            self.p_translation_unit_1 = self._p_translation_unit_1_made
+            self.p_translation_unit_2 = self._p_translation_unit_2_made
+
+        self.share_subtrees = share_subtrees
+        if share_subtrees:
+            self._shared = _SharedSubtrees()
+            self._fix_decl_name_type = self._fix_decl_name_type_sharing
+            for name in self._shared_rules:
+                setattr(self, name, self._sharing_rule(getattr(self, name)))
+
+        self.cparser = tables.make_lr_parser(self)
+
+        self.parse_cache = parse_cache
+
+        if attribute_mode not in ("parse", "raw", "strip"):
+            raise ValueError("invalid attribute_mode: %r" % attribute_mode)
+        self.attribute_mode = attribute_mode
+
+        if coord_mode not in ("eager", "lazy", "none"):
+            raise ValueError("invalid coord_mode: %r" % coord_mode)
+        self.coord_mode = coord_mode
+        if coord_mode == "lazy":
+            self._coord = self._lazy_coord
+        elif coord_mode == "none":
+            self._coord = self._no_coord
+
+    @classmethod
+    def grammar_fingerprint(cls):
+        """Return a hex digest identifying the LALR tables of *cls*.
+
+        Covers the ``p_*`` docstrings of all mixins in the MRO,
+        :attr:`OPT_RULES`, the precedence table and the token list of
+        :attr:`lexer_class`.
+        """
+        hash_obj = hashlib.sha1()
+
+        def feed(s):
+            hash_obj.update(s.encode("utf-8"))
+            hash_obj.update(b"\0")
+
+        feed(str(ply.yacc.__tabversion__))
+
+        # The *_opt rules are generated from OPT_RULES at construction time.
+        opt_funcs = set("p_%s_opt" % rule for rule in cls.OPT_RULES)
+        for name in sorted(dir(cls)):
+            if name.startswith("p_") and name not in opt_funcs:
+                feed(name)
+                feed(getattr(cls, name).__doc__ or "")
+
+        for rule in cls.OPT_RULES:
+            feed(rule)
+        feed(repr(cls.precedence))
+        for token in cls.lexer_class.tokens:
+            feed(token)
+
+        return hash_obj.hexdigest()
+
+    def _generate_parse_tables(self, yacc_debug):
+        return _ParseTables.from_lr_parser(ply.yacc.yacc(
             module=self,
             start='translation_unit',
-            debug=yacc_debug, write_tables=False)
-
-    def parse(self, text, filename='', debuglevel=0,
-            initial_type_symbols=set()):
+            debug=yacc_debug, write_tables=False))
+
+    def _load_parse_tables(self, yacc_debug, table_cache_dir):
+        if yacc_debug:
+            return self._generate_parse_tables(yacc_debug)
+
+        fingerprint = self.grammar_fingerprint()
+
+        if self.yacctab is not None:
+            tables = _read_table_module(self.yacctab, fingerprint)
+            if tables is not None:
+                return tables
+
+        if table_cache_dir is None:
+            table_cache_dir = get_table_cache_dir()
+        if not table_cache_dir:
+            return self._generate_parse_tables(yacc_debug)
+
+        cache_file = os.path.join(table_cache_dir,
+                "%s-%s-py%d%d.pickle" % (
+                    (type(self).__name__, fingerprint)
+                    + tuple(sys.version_info[:2])))
+
+        tables = _read_table_cache(cache_file)
+        if tables is None:
+            tables = self._generate_parse_tables(yacc_debug)
+            _write_table_cache(cache_file, tables)
+
+        return tables
+
+    def _type_scopes(self, initial_type_symbols, prelude=None):
+        scopes = [self.initial_type_symbols]
+        if prelude is not None:
+            scopes.append(prelude.type_symbols)
+        if initial_type_symbols:
+            if not isinstance(initial_type_symbols, (set, frozenset)):
+                initial_type_symbols = frozenset(initial_type_symbols)
+            scopes.append(initial_type_symbols)
+        return tuple(scopes)
+
+    def _reset_parse_state(self, filename, type_scopes, keep_shared=False):
+        """
+        :arg type_scopes: a sequence of sets of typedef names in file scope,
+            such as a :meth:`TypedefScopeStack.snapshot`.
+        :arg keep_shared: if *True*, keep sharing subtrees with the previous
+            parse, with ``share_subtrees=True``.
+        """
         self.clex.filename = filename
         self.clex.reset_lineno()
+        # An earlier parse may have been aborted inside a #line directive.
+        self.clex.lexer.begin("INITIAL")
+
+        self._scope_stack = TypedefScopeStack(type_scopes)
+
+        if self.share_subtrees and not keep_shared:
+            # so that a long-lived parser does not keep what it has parsed
+            self._shared = _SharedSubtrees()
+
+        if self.coord_mode == "lazy":
+            self._line_table = _LineTable()
+            self._last_lazy_coord = None
+            self._line0_coords = {}
+
+        if (self.coord_mode == "lazy" or self.skip_function_bodies
+                or self.attribute_mode != "parse" or self.share_subtrees):
+            clex = self.clex
+            clex.token = self._wrap_token_func(type(clex).token.__get__(clex),
+                    lambda: clex.lexer.lexdata, clex)
+
+    def _wrap_token_func(self, get_token, text_getter, clex):
+        if self.coord_mode == "lazy":
+            get_token = _positioned_tokens(get_token, self.clex,
+                    self._line_table, text_getter)
+
+        if self.attribute_mode != "parse":
+            get_token = _filtered_tokens(get_token, self.attribute_mode, clex)
+
+        if self.share_subtrees:
+            get_token = _shared_strings(get_token, self._shared.strings)
+
+        if self.skip_function_bodies:
+            self._next_token = get_token
+            self._last_token = None
+            get_token = self._tracking_token
+
+        return get_token
+
+    # {{{ function body skipping
+
+    def _tracking_token(self):
+        tok = self._last_token = self._next_token()
+        return tok
+
+    def _p_brace_open_skipping(self, p):
+        type(self).p_brace_open(self, p)
+
+        # Only a function body follows declaration_list_opt.
+        lbrace = p.slice[1]
+        tok = self._last_token
+        if (p.stack[-1].type != "declaration_list_opt"
+                or tok is None or tok is lbrace):
+            return
+
+        # The parser has read the first token of the body as its lookahead.
+        # Read on to the matching closing brace, and turn the lookahead into
+        # that.
+        lookahead = tok
+        get_token = self._next_token
+        depth = 1
+        while True:
+            if tok.type == "LBRACE":
+                depth += 1
+            elif tok.type == "RBRACE":
+                depth -= 1
+                if not depth:
+                    break
+
+            tok = get_token()
+            if tok is None:
+                # unterminated, let the parser report it
+                return
+
+        if tok is not lookahead:
+            lookahead.type = tok.type
+            lookahead.value = tok.value
+            lookahead.lineno = tok.lineno
+            lookahead.lexpos = tok.lexpos
+            self._last_token = lookahead
+
+        p[0] = (lbrace.lexpos, tok.lexpos + 1, lbrace.lineno)
+
+    def _p_compound_statement_skipping(self, p):
+        if isinstance(p[1], tuple):
+            start, end, lineno = p[1]
+            p[0] = SkippedCompound(start, end, self._coord(lineno))
+        else:
+            type(self).p_compound_statement_1(self, p)
+
+    # }}}
+
+    # {{{ subtree sharing
+
+    def _sharing_rule(self, rule):
+        def shared_rule(p):
+            rule(p)
+            p[0] = self._shared.share(p[0])
+
+        return shared_rule
+
+    def _fix_decl_name_type_sharing(self, decl, typename):
+        decl = pycparser.c_parser.CParser._fix_decl_name_type(
+                self, decl, typename)
+
+        parent = decl
+        type_decl = decl.type
+        while not isinstance(type_decl, c_ast.TypeDecl):
+            parent = type_decl
+            type_decl = type_decl.type
+
+        type_decl.type = self._shared.share(type_decl.type)
+        parent.type = self._shared.share(type_decl)
+        return decl
+
+    def is_shared(self, obj):
+        """Return whether the node or list *obj* may be part of more than
+        one declaration, since it was shared by the latest parse of a parser
+        made with ``share_subtrees=True``. Such objects must not be
+        modified.
+        """
+        return self.share_subtrees and id(obj) in self._shared.ids
+
+    # }}}
+
+    def _lazy_coord(self, lineno, column=None):
+        if column is not None:
+            return Coord(self.clex.filename, lineno, column)
+
+        if not lineno:
+            # nonterminals have line 0, in the current file
+            filename = self.clex.filename
+            try:
+                return self._line0_coords[filename]
+            except KeyError:
+                coord = self._line0_coords[filename] = Coord(filename, 0)
+                return coord
+
+        # Consecutive reductions often ask for the coordinates of the same
+        # token, and LazyCoords can be shared.
+        coord = self._last_lazy_coord
+        if coord != lineno:
+            coord = self._last_lazy_coord = \
+                    self._line_table.coord_class(lineno)
+        return coord
+
+    def _no_coord(self, lineno, column=None):
+        return None
+
+    # {{{ typedef scopes
+
+    def _push_scope(self):
+        self._scope_stack.push()
+
+    def _pop_scope(self):
+        self._scope_stack.pop()
+
+    def _add_typedef_type(self, name):
+        self._scope_stack.add(name)
+
+    def _is_type_in_scope(self, name):
+        return name in self._scope_stack
+
+    def _lex_type_lookup_func(self, name):
+        return name in self._scope_stack
+
+    # }}}
+
+    def _lex_error_func(self, msg, line, column):
+        self._parse_error(msg, Coord(self.clex.filename, line, column))
+
+    def p_error(self, p):
+        if p:
+            if self.coord_mode == "lazy":
+                coord = self._coord(p.lineno)
+            else:
+                coord = Coord(self.clex.filename, p.lineno)
+            self._parse_error("before: %s" % p.value, coord)
+        else:
+            self._parse_error("At end of input", "")
+
+    def parse(self, text, filename='', debuglevel=0,
+            initial_type_symbols=set(), prelude=None):
+        """
+        :arg prelude: a :class:`Prelude` which *text* is parsed as
+            following. Its declarations are prepended to those of *text*
+            in the result. They are shared by all results, not copied.
+        """
+        type_scopes = self._type_scopes(initial_type_symbols, prelude)
+
+        cache = self.parse_cache
+        if cache is not None:
+            node_factory = self.node_factory
+            if node_factory is not None:
+                # not its repr, which has its address
+                node_factory = "%s.%s" % (node_factory.__module__,
+                        getattr(node_factory, "__qualname__",
+                            node_factory.__name__))
+
+            cache_key = cache.make_key(
+                    type(self), text, filename,
+                    frozenset().union(*type_scopes),
+                    options=(self.coord_mode, self.skip_function_bodies,
+                        self.attribute_mode, node_factory, self.share_subtrees,
+                        prelude.key if prelude is not None else None))
+            result = cache.get(cache_key)
+        else:
+            result = None
+
+        if result is None:
+            result = self._parse_text(text, filename, debuglevel, type_scopes)
+            if cache is not None:
+                # without the prelude, which the key stands for
+                cache.put(cache_key, result)
 
-        # _scope_stack[-1] is the current (topmost) scope.
+        if prelude is not None:
+            result.ext = list(prelude.ext) + (result.ext or [])
 
-        self._scope_stack = [set(initial_type_symbols)
-                | getattr(self, "initial_type_symbols")]
+        return result
+
+    def _parse_text(self, text, filename, debuglevel, type_scopes):
+        self._reset_parse_state(filename, type_scopes)
 
         if not text or text.isspace():
             return c_ast.FileAST([])
+
+        return self.cparser.parse(text, lexer=self.clex, debug=debuglevel)
+
+    def parse_prelude(self, text, filename='', debuglevel=0,
+            initial_type_symbols=set()):
+        """Parse *text*, a sequence of declarations that many sources
+        start with, into a :class:`Prelude`. Sources can then be parsed
+        without it by passing that as *prelude* to :meth:`parse`.
+        """
+        type_scopes = self._type_scopes(initial_type_symbols)
+        ast = self._parse_text(text, filename, debuglevel, type_scopes)
+
+        hash_obj = hashlib.sha1()
+        for s in [type(self).__module__ + "." + type(self).__name__,
+                self.grammar_fingerprint(),
+                " ".join(sorted(frozenset().union(*type_scopes))),
+                filename, text]:
+            if not isinstance(s, bytes):
+                s = s.encode("utf-8")
+            hash_obj.update(s)
+            hash_obj.update(b"\0")
+
+        return Prelude(ast.ext or [], self._scope_stack.names(),
+                hash_obj.hexdigest())
+
+    def parse_file(self, path, encoding="utf-8", filename=None, debuglevel=0,
+            initial_type_symbols=set(), prelude=None):
+        """Parse the file at *path* like :meth:`parse`, using *path* as the
+        file name in coordinates unless *filename* is given.
+
+        The file is memory-mapped and decoded straight from the mapping, so
+        that the decoded text is the only full copy of the source that is
+        held in memory. Line endings are translated as when reading a file
+        in text mode. On Python 2, *encoding* is ignored and the source is
+        parsed as a byte string.
+        """
+        text = _read_mapped_file(path, encoding)
+        try:
+            return self.parse(text, path if filename is None else filename,
+                    debuglevel, initial_type_symbols, prelude)
+        finally:
+            # Do not keep the source alive through the lexer.
+            self.clex.input("")
+
+    def parse_tokens(self, stream, debuglevel=0, initial_type_symbols=set()):
+        """Parse a :class:`pycparserext.ext_c_lexer.TokenStream` into the
+        same :class:`pycparser.c_ast.FileAST` as :meth:`parse` of the text
+        it was lexed from, without lexing again. Coordinates use the file
+        name the stream was lexed with.
+        """
+        self._reset_parse_state(stream.filename,
+                self._type_scopes(initial_type_symbols))
+
+        if not len(stream):
+            return c_ast.FileAST([])
+
+        # Stream tokens have no source offsets, hence no columns.
+        get_token = self._wrap_token_func(
+                partial(next, stream.iter_tokens(self.clex), None),
+                lambda: None, None)
+
+        return self.cparser.parse(lexer=self.clex, debug=debuglevel,
+                tokenfunc=get_token)
+
+    def parse_many(self, sources, debuglevel=0, initial_type_symbols=set()):
+        """Parse a sequence of translation units with this parser.
+
+        :arg sources: an iterable of ``(name, text)`` pairs. *name* is used
+            as the file name in coordinates.
+        :returns: a generator of ``(name, result)`` pairs, where *result* is
+            the :class:`pycparser.c_ast.FileAST` for *text* or the exception
+            raised while parsing it. Sources are consumed and parsed lazily,
+            one at a time.
+        """
+        type_scopes = self._type_scopes(frozenset(initial_type_symbols))
+
+        for name, text in sources:
+            self._reset_parse_state(name, type_scopes)
+
+            if not text or text.isspace():
+                yield name, c_ast.FileAST([])
+                continue
+
+            try:
+                result = self.cparser.parse(
+                        text, lexer=self.clex, debug=debuglevel)
+            except Exception as e:
+                result = e
+
+            yield name, result
+
+    def parse_batch(self, sources, initial_type_symbols=set()):
+        """Parse translation units like :meth:`parse_many`, parsing the
+        longest run of external declarations they all start with only once.
+
+        Each source is then parsed from the end of that run, with the
+        typedef names and lexer state there. The declarations of the run
+        are shared between the resulting ASTs, not copied. As their
+        coordinates are shared too, the run does not extend past a
+        declaration whose coordinates take their file name from the name of
+        a source (rather than from a ``#line`` directive), unless all
+        sources have the same name.
+
+        *sources* is read completely before parsing begins. The parser must
+        have ``coord_mode="eager"``.
+        """
+        if self.coord_mode != "eager":
+            raise ValueError("parse_batch needs coord_mode='eager'")
+
+        sources = list(sources)
+        type_scopes = self._type_scopes(frozenset(initial_type_symbols))
+
+        names = set(name for name, text in sources)
+        if len(names) == 1:
+            prefix_filename = sources[0][0]
         else:
-            return self.cparser.parse(text, lexer=self.clex, debug=debuglevel)
+            # marks coordinates that would depend on the source
+            prefix_filename = "\0<shared prefix>"
+
+        shared = []
+        checkpoint = (0, 1, prefix_filename, None, type_scopes)
+
+        if len(sources) > 1:
+            text = sources[0][1]
+            common = len(os.path.commonprefix(
+                [source_text for name, source_text in sources]))
+
+            self._reset_parse_state(prefix_filename, type_scopes)
+            clex = self.clex
+            clex.input(text)
+
+            try:
+                for file_ast, (end, lineno, filename, next_type) in \
+                        _iter_translation_units(self.cparser, clex,
+                                self.p_error, allow_empty=True):
+                    decls = file_ast.ext or []
+                    file_ast.ext = []
+
+                    # The lexer looks at the rest of the line of the token
+                    # after the declarations.
+                    read_pos = clex.lexer.lexpos
+                    read_end = text.find("\n", read_pos) + 1 or len(text)
+                    if read_end > common or read_pos >= len(text):
+                        break
+                    if (len(names) > 1
+                            and _has_coord_in_file(decls, prefix_filename)):
+                        break
+
+                    shared.extend(decls)
+                    checkpoint = (end, lineno, filename, next_type,
+                            self._scope_stack.snapshot())
+            except ParseError:
+                # reported when parsing the source it is in
+                pass
+
+        end, lineno, filename, next_type, type_scopes = checkpoint
+
+        for name, text in sources:
+            # The sources share the declarations of the prefix.
+            self._reset_parse_state(
+                    name if filename == prefix_filename else filename,
+                    type_scopes, keep_shared=bool(shared))
+            clex = self.clex
+            clex.input(text)
+            clex.lexer.lexpos = end
+            clex.lexer.lineno = lineno
+
+            ext = list(shared)
+            try:
+                # As in parse_many, a source without any tokens is only
+                # valid if it is blank.
+                for file_ast, boundary in _iter_translation_units(
+                        self.cparser, clex, self.p_error,
+                        allow_empty=bool(end) or not text or text.isspace(),
+                        next_type=next_type):
+                    ext.extend(file_ast.ext or [])
+                    file_ast.ext = []
+            except Exception as e:
+                result = e
+            else:
+                result = c_ast.FileAST(ext)
+
+            yield name, result
+
+    def parse_stream(self, text, filename='', initial_type_symbols=set()):
+        """Parse *text* like :meth:`parse`, but yield each external
+        declaration (:class:`pycparser.c_ast.FuncDef`, :class:`Decl`,
+        :class:`Typedef`, ...) as soon as the parser has reduced it, instead
+        of returning a :class:`pycparser.c_ast.FileAST`.
+
+        No list of all declarations is built up, so the ASTs held at any
+        time are bounded by the largest single declaration, if the caller
+        does not keep them. Typedef names declared earlier in *text* are
+        recognized throughout, as with :meth:`parse`.
+        """
+        self._reset_parse_state(filename,
+                self._type_scopes(initial_type_symbols))
+
+        if not text or text.isspace():
+            return
+
+        self.clex.input(text)
+        for file_ast, boundary in _iter_translation_units(
+                self.cparser, self.clex, self.p_error):
+            # p_translation_unit_2 extends the same FileAST throughout.
+            ext = file_ast.ext
+            file_ast.ext = []
+            for decl in ext or []:
+                yield decl
+
+    def _make_nodes(self, decls):
+        if decls is None:
+            return None
+        return [self.node_factory(decl) for decl in decls]
+
+    def _p_translation_unit_1_made(self, p):
+        p[1] = self._make_nodes(p[1])
+        type(self).p_translation_unit_1(self, p)
+
+    def _p_translation_unit_2_made(self, p):
+        p[2] = self._make_nodes(p[2])
+        type(self).p_translation_unit_2(self, p)
 
     def p_translation_unit_2(self, p):
         """ translation_unit    : translation_unit external_declaration
@@ -65,6 +1427,18 @@ class CParserBase(pycparser.c_parser.CParser):
 
 # {{{ ast extensions
 
+# The extension nodes define __reduce__ to pickle as their constructor
+# arguments rather than as a class reference plus an attribute dict. The
+# same is done for the Coord objects they all carry, unless something else
+# has registered how to pickle them.
+
+def _reduce_coord(coord):
+    return (Coord, (coord.file, coord.line, coord.column))
+
+if Coord not in copyreg.dispatch_table:
+    copyreg.pickle(Coord, _reduce_coord)
+
+
 class TypeList(c_ast.Node):
     def __init__(self, types, coord=None):
         self.types = types
@@ -76,6 +1450,9 @@ class TypeList(c_ast.Node):
             nodelist.append(("types[%d]" % i, child))
         return tuple(nodelist)
 
+    def __reduce__(self):
+        return (type(self), (self.types, self.coord))
+
     attr_names = ()
 
 class AttributeSpecifier(c_ast.Node):
@@ -85,6 +1462,9 @@ class AttributeSpecifier(c_ast.Node):
     def children(self):
         return [("exprlist", self.exprlist)]
 
+    def __reduce__(self):
+        return (type(self), (self.exprlist,))
+
     attr_names = ()
 
 class Asm(c_ast.Node):
@@ -104,6 +1484,11 @@ class Asm(c_ast.Node):
         if self.clobbered_regs is not None: nodelist.append(("clobbered_regs", self.clobbered_regs))
         return tuple(nodelist)
 
+    def __reduce__(self):
+        return (type(self), (self.asm_keyword, self.template,
+            self.output_operands, self.input_operands, self.clobbered_regs,
+            self.coord))
+
     attr_names = ('asm_keyword',)
 
 class PreprocessorLine(c_ast.Node):
@@ -114,6 +1499,9 @@ class PreprocessorLine(c_ast.Node):
     def children(self):
         return ()
 
+    def __reduce__(self):
+        return (type(self), (self.contents, self.coord))
+
     attr_names = ("contents")
 
 class TypeOfDeclaration(c_ast.Node):
@@ -126,6 +1514,9 @@ class TypeOfDeclaration(c_ast.Node):
         if self.declaration is not None: nodelist.append(("declaration", self.declaration))
         return tuple(nodelist)
 
+    def __reduce__(self):
+        return (type(self), (self.declaration, self.coord))
+
     attr_names = ()
 
 class TypeOfExpression(c_ast.Node):
@@ -138,6 +1529,9 @@ class TypeOfExpression(c_ast.Node):
         if self.expr is not None: nodelist.append(("expr", self.expr))
         return tuple(nodelist)
 
+    def __reduce__(self):
+        return (type(self), (self.expr, self.coord))
+
     attr_names = ()
 
 class FuncDeclExt(c_ast.Node):
@@ -156,13 +1550,37 @@ class FuncDeclExt(c_ast.Node):
         if self.asm is not None: nodelist.append(("asm", self.asm))
         return tuple(nodelist)
 
+    def __reduce__(self):
+        return (type(self),
+                (self.args, self.type, self.attributes, self.asm, self.coord))
+
     attr_names = ()
 
+class SkippedCompound(c_ast.Compound):
+    """The body of a function parsed with ``skip_function_bodies=True``.
+    Its source, braces included, is ``text[start:end]`` of the parsed
+    *text* (or tokens ``start`` to ``end - 1`` of a
+    :class:`~pycparserext.ext_c_lexer.TokenStream`).
+    """
+    def __init__(self, start, end, coord=None):
+        c_ast.Compound.__init__(self, None, coord)
+        self.start = start
+        self.end = end
+
+    def __reduce__(self):
+        return (type(self), (self.start, self.end, self.coord))
+
+    attr_names = ("start", "end")
+
 # }}}
 
 # {{{ attributes
 
 class _AttributesMixin(object):
+    from pycparserext.ext_c_lexer import _ATTRIBUTE_KEYWORDS as lexer_keywords
+
+    _shared_rules = ("p_attributes_opt_1", "p_attributes_opt_2")
+
     def p_attributes_opt_1(self, p):
         """ attributes_opt : attribute_decl attributes_opt
         """
@@ -227,6 +1645,8 @@ class _AttributesMixin(object):
 # {{{ asm
 
 class _AsmMixin(object):
+    from pycparserext.ext_c_lexer import _ASM_KEYWORDS as lexer_keywords
+
     def p_asm_opt_1(self, p):
         """ asm_opt : empty
         """
@@ -298,14 +1718,60 @@ class _AsmAndAttributesMixin(_AsmMixin, _AttributesMixin):
         p[0] = self._type_modify_decl(decl=p[1], modifier=func)
 
     # }}}
+
+
+class _AttributedDeclaratorsMixin(object):
+    """Attributes after the parameter lists of function declarators, for
+    dialects built by :func:`pycparserext.dialect.make_dialect` with
+    :class:`_AttributesMixin` but without :class:`_AsmAndAttributesMixin`.
+    """
+
+    # {{{ /!\ names must match C parser to override
+
+    # These are defined under other names, since PLY warns about functions
+    # defined twice in a module.
+
+    def _p_direct_declarator_5(self, p):
+        """ direct_declarator   : direct_declarator LPAREN parameter_type_list RPAREN attributes_opt
+                                | direct_declarator LPAREN identifier_list_opt RPAREN attributes_opt
+        """
+        func = FuncDeclExt(
+            args=p[3],
+            type=None,
+            attributes=p[5],
+            asm=None,
+            coord=p[1].coord)
+
+        p[0] = self._type_modify_decl(decl=p[1], modifier=func)
+
+    def _p_direct_abstract_declarator_6(self, p):
+        """ direct_abstract_declarator  : direct_abstract_declarator LPAREN parameter_type_list_opt RPAREN attributes_opt
+        """
+        func = FuncDeclExt(
+            args=p[3],
+            type=None,
+            attributes=p[5],
+            asm=None,
+            coord=p[1].coord)
+
+        p[0] = self._type_modify_decl(decl=p[1], modifier=func)
+
+    p_direct_declarator_5 = _p_direct_declarator_5
+    p_direct_abstract_declarator_6 = _p_direct_abstract_declarator_6
+
+    # }}}
+
 # }}}
 
 # {{{ gnu parser
 
-class GnuCParser(_AsmAndAttributesMixin, CParserBase):
-    # TODO: __extension__
+class _GnuMixin(object):
+    """GNU extensions other than attributes and ``asm``. Requires
+    :class:`_AttributesMixin`.
+    """
 
-    from pycparserext.ext_c_lexer import GNUCLexer as lexer_class
+    from pycparserext.ext_c_lexer import (
+            GNUCLexer as lexer_rules, _GNU_KEYWORDS as lexer_keywords)
 
     initial_type_symbols = set(["__builtin_va_list"])
 
@@ -352,14 +1818,24 @@ class GnuCParser(_AsmAndAttributesMixin, CParserBase):
         """
         p[0] = c_ast.ID(name="__const", coord=self._coord(p.lineno(1)))
 
+
+class GnuCParser(_GnuMixin, _AsmAndAttributesMixin, CParserBase):
+    # TODO: __extension__
+
+    from pycparserext.ext_c_lexer import GNUCLexer as lexer_class
+    yacctab = "pycparserext.gnu_yacctab"
+
 # }}}
 
 
 
 
 
-class OpenCLCParser(_AsmAndAttributesMixin, CParserBase):
-    from pycparserext.ext_c_lexer import OpenCLCLexer as lexer_class
+# {{{ opencl parser
+
+class _OpenCLMixin(object):
+    from pycparserext.ext_c_lexer import (
+            OpenCLCLexer as lexer_rules, _OPENCL_KEYWORDS as lexer_keywords)
 
     INT_BIT_COUNTS = [8,16,32,64]
     initial_type_symbols = (
@@ -428,4 +1904,11 @@ class OpenCLCParser(_AsmAndAttributesMixin, CParserBase):
         """
         p[0] = p[1]
 
+
+class OpenCLCParser(_OpenCLMixin, _AsmAndAttributesMixin, CParserBase):
+    from pycparserext.ext_c_lexer import OpenCLCLexer as lexer_class
+    yacctab = "pycparserext.opencl_yacctab"
+
+# }}}
+
 # vim: fdm=marker
@@ -0,0 +1,271 @@
+"""Incremental reparsing of edited sources.
+
+:class:`IncrementalParser` keeps, next to the :class:`pycparser.c_ast.FileAST`
+of a source, the text span and the lexer and typedef state at the end of
+each top-level (external) declaration. After an edit, declarations that end
+before the edited range are reused as they are. Parsing restarts at the
+first affected declaration and stops as soon as it reaches the end of an
+old declaration behind the edited range with the same typedef names in
+scope. The old declarations from there on are reused, with their
+coordinates shifted by the number of lines inserted or removed::
+
+    from pycparserext.ext_c_parser import OpenCLCParser
+    from pycparserext.incremental import IncrementalParser
+
+    inc = IncrementalParser(OpenCLCParser(), text, "prog.cl")
+    ast = inc.edit(start, end, "new text")
+
+Reused subtrees are shared with (and their coordinates updated in) earlier
+ASTs of the same source.
+"""
+
+from __future__ import division
+
+import re
+from bisect import bisect_left
+
+import pycparser.c_ast as c_ast
+from pycparser.plyparser import Coord
+
+from pycparserext.ext_c_parser import _iter_translation_units
+from pycparserext.walk import walk
+
+
+# #line directives (and their short form "# 12") set the line number and
+# file name, so declarations after them cannot be shifted. The lexer
+# recognizes them anywhere, not just at the start of a line.
+_LINE_DIRECTIVE_RE = re.compile(r"#[ \t]*(line\b|[0-9])")
+
+
+class _Chunk(object):
+    """The external declarations parsed from ``text[start:end]``, with the
+    state of the lexer and of the file scope after them.
+
+    The parser reads the token after *end* before it reduces the
+    declarations. That token has no part in them, but the coordinates of
+    some of their nodes take their file name from the lexer at that point,
+    which may be after a ``#line`` directive. *read_end* is the end of the
+    line of that token, since the lexer looks at the rest of a line to
+    recognize the directive.
+
+    *verified* tells whether the chunk is part of a parse of the whole
+    source that succeeded.
+    """
+
+    __slots__ = ("start", "end", "read_end", "end_lineno", "end_filename",
+            "next_type", "typedefs", "decls", "has_line_directive",
+            "verified")
+
+    def __init__(self, start, end, read_end, end_lineno, end_filename,
+            next_type, typedefs, decls, has_line_directive, verified=False):
+        self.start = start
+        self.end = end
+        self.read_end = read_end
+        self.end_lineno = end_lineno
+        self.end_filename = end_filename
+        self.next_type = next_type
+        self.typedefs = typedefs
+        self.decls = decls
+        self.has_line_directive = has_line_directive
+        self.verified = verified
+
+    def shifted(self, delta, line_delta):
+        if not (delta or line_delta):
+            return self
+
+        if line_delta:
+            coord_map = {}
+            for decl in self.decls:
+                _shift_coords(decl, line_delta, coord_map)
+
+        return _Chunk(self.start + delta, self.end + delta,
+                self.read_end + delta, self.end_lineno + line_delta,
+                self.end_filename, self.next_type, self.typedefs, self.decls,
+                self.has_line_directive, self.verified)
+
+
+def _shift_coords(node, line_delta, coord_map):
+    for node in walk(node):
+        coord = getattr(node, "coord", None)
+        # pycparser gives coords of some nonterminals line 0, which stays.
+        if coord is not None and coord.line:
+            # Coords may be shared between nodes: shift each one only once.
+            try:
+                node.coord = coord_map[id(coord)]
+            except KeyError:
+                new_coord = Coord(coord.file, coord.line + line_delta,
+                        coord.column)
+                coord_map[id(coord)] = coord_map[id(new_coord)] = new_coord
+                node.coord = new_coord
+
+
+def _find_resync(old_chunks, old_ends, chunk, edit_end, delta):
+    """Return the index of the old chunk after which the old parse can be
+    reused once the new *chunk* has been parsed, or *None*.
+    """
+    old_end = chunk.end - delta
+    if old_end < edit_end:
+        return None
+
+    i = bisect_left(old_ends, old_end)
+    if i == len(old_chunks) or old_ends[i] != old_end:
+        return None
+
+    old_chunk = old_chunks[i]
+    if (old_chunk.typedefs != chunk.typedefs
+            and (frozenset().union(*old_chunk.typedefs)
+                != frozenset().union(*chunk.typedefs))
+            or old_chunk.end_filename != chunk.end_filename
+            or old_chunk.next_type != chunk.next_type):
+        return None
+
+    return i
+
+
+class IncrementalParser(object):
+    """
+    :arg parser: an instance of
+        :class:`pycparserext.ext_c_parser.CParserBase`, used for all parses
+        of this source. Its *coord_mode* must be ``"eager"``, and it must
+        not skip function bodies.
+
+    .. attribute:: text
+
+        The current source text.
+
+    .. attribute:: ast
+
+        The :class:`pycparser.c_ast.FileAST` of :attr:`text`.
+    """
+
+    def __init__(self, parser, text, filename='', initial_type_symbols=set()):
+        if parser.coord_mode != "eager" or parser.skip_function_bodies:
+            raise ValueError("IncrementalParser needs a parser with "
+                    "coord_mode='eager' and skip_function_bodies=False")
+
+        self.parser = parser
+        self.filename = filename
+        self.type_scopes = parser._type_scopes(
+                frozenset(initial_type_symbols))
+
+        self.text = ""
+
+        # _chunks[:_verified] tile a prefix of text. Further chunks are left
+        # from before an edit that failed to parse. _complete tells whether
+        # no tokens follow the last chunk. Only chunks of the last parse
+        # that succeeded are reused behind an edit.
+        self._chunks = []
+        self._verified = 0
+        self._complete = False
+        self.ast = None
+
+        self.edit(0, 0, text)
+
+    def _parse_chunks(self, text, start, lineno, filename, next_type,
+            typedefs):
+        parser = self.parser
+        parser._reset_parse_state(filename, typedefs)
+        clex = parser.clex
+        clex.input(text)
+        clex.lexer.lexpos = start
+        clex.lexer.lineno = lineno
+
+        for file_ast, (end, end_lineno, end_filename, next_type) in \
+                _iter_translation_units(parser.cparser, clex, parser.p_error,
+                        allow_empty=True, next_type=next_type):
+            # shared between chunks that do not declare typedefs
+            typedefs = parser._scope_stack.snapshot()
+
+            read_end = text.find("\n", clex.lexer.lexpos) + 1 or len(text)
+
+            yield _Chunk(start, end, read_end, end_lineno, end_filename,
+                    next_type, typedefs,
+                    file_ast.ext or [],
+                    _LINE_DIRECTIVE_RE.search(text, start, end) is not None)
+
+            file_ast.ext = []
+            start = end
+
+    def edit(self, start, end, replacement):
+        """Replace ``text[start:end]`` by *replacement* and return the
+        updated :attr:`ast`.
+
+        If the new text fails to parse, the exception propagates and
+        :attr:`ast` is left unchanged. The declarations after the edit are
+        kept, so that they can be reused once a later edit repairs the
+        source.
+        """
+        text = self.text[:start] + replacement + self.text[end:]
+        delta = len(replacement) - (end - start)
+
+        old_chunks = [chunk for chunk in self._chunks if chunk.verified]
+        old_ends = [chunk.end for chunk in old_chunks]
+        old_complete = self._complete
+
+        # An edit right at read_end could extend the token read there.
+        new_chunks = self._chunks[:bisect_left(
+            [chunk.read_end for chunk in self._chunks[:self._verified]],
+            start)]
+        self.text = text
+
+        try:
+            while True:
+                if new_chunks:
+                    last = new_chunks[-1]
+                    state = (last.end, last.end_lineno, last.end_filename,
+                            last.next_type, last.typedefs)
+                else:
+                    state = (0, 1, self.filename, None, self.type_scopes)
+
+                resync = None
+                for chunk in self._parse_chunks(text, *state):
+                    new_chunks.append(chunk)
+                    resync = _find_resync(old_chunks, old_ends, chunk, end,
+                            delta)
+                    if resync is not None:
+                        break
+                else:
+                    break
+
+                line_delta = chunk.end_lineno - old_chunks[resync].end_lineno
+                i = resync + 1
+                while (i < len(old_chunks)
+                        and old_chunks[i].start == old_chunks[i - 1].end
+                        and not (line_delta
+                            and old_chunks[i].has_line_directive)):
+                    new_chunks.append(old_chunks[i].shifted(delta, line_delta))
+                    i += 1
+
+                if i == len(old_chunks):
+                    if old_complete:
+                        break
+                    # The old text after the last old chunk did not parse.
+                    old_chunks = old_ends = []
+                else:
+                    # Reparse from the #line directive, or from the gap left
+                    # by a failed edit, on, and look for the next chance to
+                    # resynchronize after it.
+                    end = old_chunks[i].start
+                    old_chunks = old_chunks[i:]
+                    old_ends = old_ends[i:]
+
+        except Exception:
+            # Keep the old chunks behind the edit as unverified candidates
+            # for resynchronization.
+            parsed_end = new_chunks[-1].end if new_chunks else 0
+            tail = [chunk.shifted(delta, 0) for chunk in old_chunks
+                    if chunk.start >= end and chunk.end + delta > parsed_end]
+            self._chunks = new_chunks + tail
+            self._verified = len(new_chunks)
+            self._complete = old_complete and bool(tail)
+            raise
+
+        for chunk in new_chunks:
+            chunk.verified = True
+        self._chunks = new_chunks
+        self._verified = len(new_chunks)
+        self._complete = True
+
+        self.ast = c_ast.FileAST(
+                [decl for chunk in new_chunks for decl in chunk.decls])
+        return self.ast
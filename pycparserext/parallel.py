@@ -0,0 +1,91 @@
+"""Parsing many translation units on multiple cores.
+
+Sources are spread over a :class:`concurrent.futures.ProcessPoolExecutor`
+(Python 3.7 or newer). Each worker process holds one warm parser, obtained
+from :mod:`pycparserext.registry` when the worker starts, and parses
+every source it is given with it. ASTs travel back to the calling process
+pickled, which is why the extension nodes in
+:mod:`pycparserext.ext_c_parser` pickle as their constructor arguments.
+
+Results come back in input order, as the ``(name, FileAST or exception)``
+pairs that :meth:`~pycparserext.ext_c_parser.CParserBase.parse_many`
+produces.
+"""
+
+from __future__ import division
+
+import io
+
+from pycparserext.ext_c_parser import GnuCParser
+
+
+_worker_parser = None
+
+
+def _init_worker(parser_class, parser_kwargs):
+    global _worker_parser
+
+    from pycparserext.registry import get_parser
+    _worker_parser = get_parser(parser_class, **parser_kwargs)
+
+
+def _parse_source(source):
+    return next(_worker_parser.parse_many([source]))
+
+
+def _parse_file(filename_and_encoding):
+    filename, encoding = filename_and_encoding
+    try:
+        with io.open(filename, encoding=encoding) as inf:
+            text = inf.read()
+    except (IOError, OSError) as e:
+        return filename, e
+
+    return _parse_source((filename, text))
+
+
+def _map_in_pool(func, items, parser_class, parser_kwargs, max_workers,
+        chunksize):
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_init_worker,
+            initargs=(parser_class, parser_kwargs)) as executor:
+        for result in executor.map(func, items, chunksize=chunksize):
+            yield result
+
+
+def parse_sources(sources, parser_class=GnuCParser, max_workers=None,
+        chunksize=8, parser_kwargs=None):
+    """Parse ``(name, text)`` pairs in worker processes.
+
+    :arg parser_class: the dialect to parse, e.g.
+        :class:`~pycparserext.ext_c_parser.OpenCLCParser`.
+    :arg max_workers: number of worker processes, defaulting to the number
+        of CPUs.
+    :arg chunksize: number of sources sent to a worker at a time. Larger
+        values reduce the communication overhead for many small sources.
+    :arg parser_kwargs: passed to the constructor of *parser_class*.
+    :returns: an iterator of ``(name, FileAST or exception)`` pairs, in the
+        order of *sources*.
+    """
+    if parser_kwargs is None:
+        parser_kwargs = {}
+
+    return _map_in_pool(_parse_source, sources, parser_class, parser_kwargs,
+            max_workers, chunksize)
+
+
+def parse_files(filenames, parser_class=GnuCParser, encoding="utf-8",
+        max_workers=None, chunksize=8, parser_kwargs=None):
+    """Like :func:`parse_sources`, but for a sequence of file names. The
+    files are read by the workers. File names are used as names in the
+    results and in coordinates.
+    """
+    if parser_kwargs is None:
+        parser_kwargs = {}
+
+    return _map_in_pool(_parse_file,
+            ((filename, encoding) for filename in filenames),
+            parser_class, parser_kwargs, max_workers, chunksize)
@@ -0,0 +1,156 @@
+"""Memoization of parse results.
+
+A :class:`ParseCache` passed to a parser as *parse_cache* makes
+:meth:`~pycparserext.ext_c_parser.CParserBase.parse` return the stored AST
+of a text it has seen before, with the same parser class, file name and
+initial type symbols::
+
+    from pycparserext.ext_c_parser import OpenCLCParser
+    from pycparserext.parse_cache import ParseCache
+
+    parser = OpenCLCParser(parse_cache=ParseCache(cache_dir="/tmp/asts"))
+
+ASTs are stored pickled, in memory (least recently used entries are
+evicted beyond *max_size* bytes) and, if a *cache_dir* is given, on disk.
+Each lookup unpickles a fresh AST, so callers may modify what they get.
+Texts that fail to parse are not cached.
+"""
+
+from __future__ import division
+
+import os
+import sys
+import hashlib
+import threading
+from collections import OrderedDict
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from pycparserext.ext_c_parser import _write_cache_file
+
+
+class ParseCache(object):
+    """
+    :arg max_size: the total size in bytes of the pickled ASTs kept in
+        memory.
+    :arg cache_dir: directory for the on-disk store, or *None* to keep ASTs
+        in memory only.
+
+    .. attribute:: memory_hits
+    .. attribute:: disk_hits
+    .. attribute:: misses
+    """
+
+    def __init__(self, max_size=64 * 1024 * 1024, cache_dir=None):
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+
+        self._lock = threading.Lock()
+
+        # maps key to pickled AST, least recently used first
+        self._entries = OrderedDict()
+        self._size = 0
+
+        # maps parser class to its grammar fingerprint
+        self._fingerprints = {}
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @property
+    def hits(self):
+        return self.memory_hits + self.disk_hits
+
+    def make_key(self, parser_class, text, filename, type_symbols,
+            options=()):
+        try:
+            fingerprint = self._fingerprints[parser_class]
+        except KeyError:
+            fingerprint = self._fingerprints[parser_class] = \
+                    parser_class.grammar_fingerprint()
+
+        hash_obj = hashlib.sha1()
+
+        def feed(s):
+            if not isinstance(s, bytes):
+                s = s.encode("utf-8")
+            hash_obj.update(s)
+            hash_obj.update(b"\0")
+
+        feed(parser_class.__module__ + "." + parser_class.__name__)
+        feed(fingerprint)
+        feed(" ".join(sorted(type_symbols)))
+        feed(repr(tuple(options)))
+        feed(filename)
+        feed(text)
+
+        return hash_obj.hexdigest()
+
+    def _disk_filename(self, key):
+        # pickles of ASTs are not portable between Python versions
+        return os.path.join(self.cache_dir,
+                "%s-py%d%d.pickle" % ((key,) + tuple(sys.version_info[:2])))
+
+    def get(self, key):
+        """Return a new copy of the AST stored under *key*, or *None*."""
+        with self._lock:
+            data = self._entries.pop(key, None)
+            if data is not None:
+                self._entries[key] = data
+                self.memory_hits += 1
+
+        if data is None and self.cache_dir is not None:
+            try:
+                with open(self._disk_filename(key), "rb") as inf:
+                    data = inf.read()
+                ast = pickle.loads(data)
+            except Exception:
+                # missing, truncated or unreadable
+                pass
+            else:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._store_in_memory(key, data)
+                return ast
+
+        if data is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        return pickle.loads(data)
+
+    def put(self, key, ast):
+        """Store a copy of *ast* under *key*."""
+        data = pickle.dumps(ast, pickle.HIGHEST_PROTOCOL)
+
+        with self._lock:
+            self._store_in_memory(key, data)
+
+        if self.cache_dir is not None:
+            _write_cache_file(self._disk_filename(key), data)
+
+    def _store_in_memory(self, key, data):
+        old_data = self._entries.pop(key, None)
+        if old_data is not None:
+            self._size -= len(old_data)
+
+        if len(data) > self.max_size:
+            return
+
+        self._entries[key] = data
+        self._size += len(data)
+
+        while self._size > self.max_size:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    def clear(self):
+        """Empty the in-memory tier. The on-disk store is left alone."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
@@ -0,0 +1,58 @@
+"""Process-wide sharing of parser tables.
+
+A parser's LALR tables are immutable once built, but constructing a parser
+class loads (or generates) them again. :class:`ParserRegistry` builds them
+once per parser class and hands out cheap parser sessions that share
+them::
+
+    from pycparserext.registry import get_parser
+    from pycparserext.ext_c_parser import OpenCLCParser
+
+    parser = get_parser(OpenCLCParser)
+
+Sessions carry their own lexer position and typedef scopes, so each one
+must only be used by one thread at a time. Obtaining a new session for
+each job is cheap.
+"""
+
+from __future__ import division
+
+import threading
+
+
+class ParserRegistry(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+
+        # maps parser class to its parse tables
+        self._tables = {}
+
+    def get_tables(self, parser_class):
+        with self._lock:
+            try:
+                return self._tables[parser_class]
+            except KeyError:
+                tables = parser_class().parse_tables
+                self._tables[parser_class] = tables
+                return tables
+
+    def get_parser(self, parser_class, **kwargs):
+        """Return a new instance of *parser_class* that shares its tables
+        with all other sessions of *parser_class* obtained from this
+        registry. *kwargs* are passed to the constructor.
+        """
+        return parser_class(tables=self.get_tables(parser_class), **kwargs)
+
+    def clear(self):
+        with self._lock:
+            self._tables.clear()
+
+
+registry = ParserRegistry()
+
+
+def get_parser(parser_class, **kwargs):
+    """Return a session of *parser_class* from the process-wide
+    :data:`registry`.
+    """
+    return registry.get_parser(parser_class, **kwargs)
@@ -0,0 +1,221 @@
+"""An index of the names declared at file scope in a
+:class:`pycparser.c_ast.FileAST`.
+
+:class:`SymbolIndex` maps names to the nodes that declare them, for each
+namespace of C: ordinary identifiers (functions, variables and enumeration
+constants), tags (of structs, unions and enums) and typedef names::
+
+    from pycparserext.symbol_index import SymbolIndex
+
+    index = SymbolIndex(ast)
+    func_def = index.lookup("main")
+    struct = index.lookup("point", "tag")
+
+The index is built the first time it is used, in one pass over
+``ast.ext``. Callers that change ``ast.ext`` afterwards tell it with
+:meth:`SymbolIndex.add` and :meth:`SymbolIndex.remove`, which only look
+at the declaration in question.
+"""
+
+from __future__ import division
+
+import pycparser.c_ast as c_ast
+
+from pycparserext.ext_c_parser import FuncDeclExt
+from pycparserext.walk import iter_child_nodes
+
+
+ORDINARY = "ordinary"
+TAG = "tag"
+TYPEDEF = "typedef"
+
+_NAMESPACES = (ORDINARY, TAG, TYPEDEF)
+
+
+# {{{ declared names
+
+def _file_scope_nodes(node):
+    # Tags and enumeration constants declared in parameter lists and in
+    # statement expressions have a scope of their own.
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node is None or isinstance(node, (c_ast.ParamList, c_ast.Compound)):
+            continue
+        yield node
+        stack.extend(iter_child_nodes(node))
+
+
+def _declared_names(ext):
+    """Yield ``(namespace, name, node)`` for the names that the external
+    declaration *ext* declares.
+    """
+    if isinstance(ext, c_ast.FuncDef):
+        yield ORDINARY, ext.decl.name, ext
+        root = ext.decl.type
+    elif isinstance(ext, c_ast.Typedef):
+        yield TYPEDEF, ext.name, ext
+        root = ext.type
+    elif isinstance(ext, c_ast.Decl):
+        if ext.name is None:
+            # "struct point;" declares the tag even without a body.
+            tag = ext.type
+            if (isinstance(tag, (c_ast.Struct, c_ast.Union, c_ast.Enum))
+                    and tag.name is not None and not _is_definition(tag)):
+                yield TAG, tag.name, tag
+        else:
+            yield ORDINARY, ext.name, ext
+        root = ext.type
+    else:
+        return
+
+    for node in _file_scope_nodes(root):
+        if isinstance(node, (c_ast.Struct, c_ast.Union)):
+            if node.name is not None and node.decls is not None:
+                yield TAG, node.name, node
+        elif isinstance(node, c_ast.Enum):
+            if node.name is not None and node.values is not None:
+                yield TAG, node.name, node
+        elif isinstance(node, c_ast.Enumerator):
+            yield ORDINARY, node.name, node
+
+
+def _is_definition(node):
+    if isinstance(node, (c_ast.Struct, c_ast.Union)):
+        return node.decls is not None
+    elif isinstance(node, c_ast.Enum):
+        return node.values is not None
+    elif isinstance(node, c_ast.Decl):
+        # tentative definitions included
+        return ("extern" not in node.storage
+                and not isinstance(node.type, (c_ast.FuncDecl, FuncDeclExt)))
+    else:
+        # function definitions, typedefs and enumeration constants
+        return True
+
+# }}}
+
+
+# {{{ symbol index
+
+class SymbolIndex(object):
+    """Maps the names declared at file scope in :attr:`ast` to the nodes
+    that declare them: :class:`pycparser.c_ast.FuncDef`,
+    :class:`pycparser.c_ast.Decl` and :class:`pycparser.c_ast.Typedef`
+    nodes of ``ast.ext``, and the :class:`pycparser.c_ast.Enumerator`,
+    :class:`pycparser.c_ast.Struct`, :class:`pycparser.c_ast.Union` and
+    :class:`pycparser.c_ast.Enum` nodes within them.
+
+    *namespace* arguments are one of :data:`ORDINARY`, :data:`TAG` and
+    :data:`TYPEDEF`. Typedef names, which C puts among the ordinary
+    identifiers, are kept apart here. Tags are indexed where they are
+    defined or declared on their own, as in ``struct point;``, not where
+    they are only used.
+
+    .. attribute:: ast
+
+        The :class:`pycparser.c_ast.FileAST` indexed.
+    """
+
+    def __init__(self, ast):
+        self.ast = ast
+
+        # maps namespaces to dicts from names to lists of declaring nodes
+        self._namespaces = None
+        # maps id() of indexed external declarations to them and their
+        # _declared_names()
+        self._indexed = None
+
+    def _get_namespace(self, namespace):
+        if self._namespaces is None:
+            self._namespaces = dict((ns, {}) for ns in _NAMESPACES)
+            self._indexed = {}
+            for ext in self.ast.ext or ():
+                self._add(ext)
+
+        try:
+            return self._namespaces[namespace]
+        except KeyError:
+            raise ValueError("invalid namespace: %r" % namespace)
+
+    def _add(self, ext):
+        if id(ext) in self._indexed:
+            return
+
+        names = list(_declared_names(ext))
+        self._indexed[id(ext)] = (ext, names)
+        namespaces = self._namespaces
+        for namespace, name, node in names:
+            namespaces[namespace].setdefault(name, []).append(node)
+
+    def declarations(self, name, namespace=ORDINARY):
+        """Return a tuple of the nodes that declare *name* in *namespace*,
+        in the order they were indexed.
+        """
+        nodes = self._get_namespace(namespace).get(name, ())
+
+        # Declarators of one declaration share their struct definitions.
+        result = []
+        seen = set()
+        for node in nodes:
+            if id(node) not in seen:
+                seen.add(id(node))
+                result.append(node)
+        return tuple(result)
+
+    def lookup(self, name, namespace=ORDINARY):
+        """Return the node that defines *name* in *namespace*, or the
+        first one that declares it if none does, or *None* if it is not
+        declared.
+
+        Function definitions, struct, union and enum definitions, and
+        declarations of variables that are not ``extern`` count as
+        definitions.
+        """
+        nodes = self._get_namespace(namespace).get(name)
+        if not nodes:
+            return None
+
+        for node in nodes:
+            if _is_definition(node):
+                return node
+        return nodes[0]
+
+    def names(self, namespace=ORDINARY):
+        """Return a :class:`frozenset` of the names declared in
+        *namespace*.
+        """
+        return frozenset(self._get_namespace(namespace))
+
+    def add(self, ext):
+        """Index the external declaration *ext*, after it has been added to
+        ``ast.ext``.
+        """
+        if self._namespaces is not None:
+            self._add(ext)
+
+    def remove(self, ext):
+        """Drop the external declaration *ext* from the index, after it has
+        been removed from ``ast.ext``.
+        """
+        if self._namespaces is None:
+            return
+
+        try:
+            ext, names = self._indexed.pop(id(ext))
+        except KeyError:
+            return
+
+        namespaces = self._namespaces
+        for namespace, name, node in names:
+            nodes = namespaces[namespace][name]
+            for i, other in enumerate(nodes):
+                if other is node:
+                    del nodes[i]
+                    break
+            if not nodes:
+                del namespaces[namespace][name]
+
+# }}}
+
+# vim: fdm=marker
@@ -0,0 +1,244 @@
+"""Iterative traversal of ASTs.
+
+:func:`walk` visits the nodes of a tree of :mod:`pycparser.c_ast` or
+:mod:`pycparserext.ext_c_parser` nodes (compact ones included) in pre-order
+or post-order, in the order that ``children()`` gives them, optionally only
+those of some classes::
+
+    from pycparser import c_ast
+    from pycparserext.walk import walk
+
+    calls = [node.name.name for node in walk(ast, node_class=c_ast.FuncCall)
+            if isinstance(node.name, c_ast.ID)]
+
+It uses an explicit stack, so deeply nested expressions do not run into the
+recursion limit. Instead of calling ``children()``, which builds a tuple of
+``(name, child)`` pairs for each node, it reads the children straight from
+their fields. Which fields hold children is found once per class, by calling
+``children()`` on a probe object. Classes for which that fails are walked
+through ``children()``.
+"""
+
+from __future__ import division
+
+import re
+
+
+# {{{ child fields
+
+class _Marker(object):
+    pass
+
+
+_MARKER = _Marker()
+
+
+class _Probe(object):
+    # Every field holds a list of one marker, so that children() names
+    # list fields with an index.
+    def __getattr__(self, name):
+        return [_MARKER]
+
+
+_CHILD_NAME_RE = re.compile(r"^([A-Za-z_][A-Za-z_0-9]*)(\[0\])?$")
+
+# maps node types to their child fields, as (name, is_list) tuples, or to
+# None if children() must be called
+_CHILD_FIELDS = {}
+
+
+def _probe_child_fields(node_type):
+    children = getattr(node_type, "children")
+    # unbound methods check the class of self on Python 2
+    children = getattr(children, "__func__", children)
+
+    try:
+        pairs = list(children(_Probe()))
+    except Exception:
+        return None
+
+    fields = []
+    for name, child in pairs:
+        match = _CHILD_NAME_RE.match(name)
+        if match is None:
+            return None
+        is_list = match.group(2) is not None
+        if is_list:
+            valid = child is _MARKER
+        else:
+            valid = type(child) is list and child == [_MARKER]
+        if not valid:
+            return None
+        fields.append((match.group(1), is_list))
+
+    return tuple(fields)
+
+
+def child_fields(node_class):
+    """Return the names of the fields of *node_class* that hold its
+    children, in the order that ``children()`` gives them, as a tuple of
+    ``(name, is_list)`` pairs. Return *None* if they cannot be told.
+    """
+    try:
+        return _CHILD_FIELDS[node_class]
+    except KeyError:
+        result = _CHILD_FIELDS[node_class] = _probe_child_fields(node_class)
+        return result
+
+
+def iter_child_nodes(node):
+    """Yield the children of *node*, like ``children()`` but without their
+    names.
+    """
+    fields = child_fields(type(node))
+    if fields is None:
+        for name, child in node.children():
+            yield child
+        return
+
+    for name, is_list in fields:
+        value = getattr(node, name)
+        if value is None:
+            continue
+        if is_list:
+            for child in value:
+                yield child
+        else:
+            yield value
+
+# }}}
+
+
+# {{{ walk
+
+# maps node types to their child fields in reverse, or None
+_REVERSED_CHILD_FIELDS = {}
+
+
+def _reversed_child_fields(node_type):
+    try:
+        return _REVERSED_CHILD_FIELDS[node_type]
+    except KeyError:
+        fields = child_fields(node_type)
+        if fields is not None:
+            fields = fields[::-1]
+        result = _REVERSED_CHILD_FIELDS[node_type] = fields
+        return result
+
+
+def _iter_preorder(node):
+    fields_by_type = _REVERSED_CHILD_FIELDS
+
+    stack = [node]
+    pop = stack.pop
+    push = stack.append
+    extend = stack.extend
+    while stack:
+        node = pop()
+        if node is None:
+            continue
+        yield node
+
+        # Push the children so that the first one is popped first.
+        node_type = type(node)
+        try:
+            fields = fields_by_type[node_type]
+        except KeyError:
+            fields = _reversed_child_fields(node_type)
+        if fields is None:
+            extend(child for name, child in reversed(node.children()))
+            continue
+
+        for name, is_list in fields:
+            value = getattr(node, name)
+            if value is not None:
+                if is_list:
+                    extend(value[::-1])
+                else:
+                    push(value)
+
+
+# marks the end of the children of a node on the stack
+_EXIT = object()
+
+
+def _iter_postorder(node):
+    fields_by_type = _REVERSED_CHILD_FIELDS
+
+    stack = [node]
+    pop = stack.pop
+    push = stack.append
+    extend = stack.extend
+    # the nodes whose children are being walked
+    parents = []
+    while stack:
+        node = pop()
+        if node is _EXIT:
+            yield parents.pop()
+            continue
+        if node is None:
+            continue
+
+        parents.append(node)
+        push(_EXIT)
+
+        node_type = type(node)
+        try:
+            fields = fields_by_type[node_type]
+        except KeyError:
+            fields = _reversed_child_fields(node_type)
+        if fields is None:
+            extend(child for name, child in reversed(node.children()))
+            continue
+
+        for name, is_list in fields:
+            value = getattr(node, name)
+            if value is not None:
+                if is_list:
+                    extend(value[::-1])
+                else:
+                    push(value)
+
+
+def walk(node, order="pre", node_class=None):
+    """Yield the nodes of the tree under *node*, *node* included.
+
+    :arg order: ``"pre"`` to yield each node before its children, or
+        ``"post"`` to yield it after them. Children come in the order that
+        ``children()`` gives them.
+    :arg node_class: a class or tuple of classes, as for
+        :func:`isinstance`, to yield only the nodes of. All nodes are
+        walked through either way.
+
+    Nodes that occur more than once in the tree are yielded each time.
+    Changing the children of a node that has been yielded in pre-order
+    changes what is walked next.
+    """
+    if order == "pre":
+        nodes = _iter_preorder(node)
+    elif order == "post":
+        nodes = _iter_postorder(node)
+    else:
+        raise ValueError("invalid order: %r" % order)
+
+    if node_class is None:
+        return nodes
+
+    return _filter_nodes(nodes, node_class)
+
+
+def _filter_nodes(nodes, node_class):
+    # maps node types to whether they match, as isinstance() would tell
+    matches = {}
+    for node in nodes:
+        node_type = type(node)
+        try:
+            match = matches[node_type]
+        except KeyError:
+            match = matches[node_type] = isinstance(node, node_class)
+        if match:
+            yield node
+
+# }}}
+
+# vim: fdm=marker
@@ -12,6 +12,26 @@ except ImportError:
     # 2.x
     from distutils.command.build_py import build_py
 
+
+def _run_build_tables(build_lib):
+    import sys
+    from subprocess import check_call
+
+    # Run inside the staging directory so that the (possibly 2to3-converted)
+    # package being installed is the one whose grammar gets compiled.
+    # pycparser and ply are build requirements (see pyproject.toml), so a
+    # failure here fails the build rather than shipping without tables.
+    check_call(
+            [sys.executable, "-B", "-m", "pycparserext._build_tables"],
+            cwd=build_lib)
+
+
+class build_py_with_tables(build_py):
+    def run(self):
+        build_py.run(self)
+        self.execute(_run_build_tables, (self.build_lib,),
+                msg="generating LALR tables for the built-in dialects")
+
 setup(name="pycparserext",
       version="2012.1",
       description="Extensions for pycparser",
@@ -35,7 +55,8 @@ setup(name="pycparserext",
         ],
 
       install_requires=[
-          "pycparser>=2.05"
+          "pycparser>=2.05",
+          "ply>=3.4",
           ],
 
       author="Andreas Kloeckner",
@@ -44,5 +65,5 @@ setup(name="pycparserext",
       license = "MIT",
       packages=["pycparserext"],
 
-      # 2to3 invocation
-      cmdclass={'build_py': build_py})
+      # 2to3 invocation, table generation
+      cmdclass={'build_py': build_py_with_tables})
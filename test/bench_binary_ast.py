@@ -0,0 +1,73 @@
+"""Speed benchmark for :mod:`pycparserext.binary_ast`.
+
+Compares :mod:`pycparserext.binary_ast` against :mod:`pickle` at its
+highest protocol on the AST of about ``--size`` megabytes of GNU C, once
+made of regular and once of compact nodes. For each format, prints the best
+of ``--repeat`` times to save and to load the AST (in seconds) and the size
+of the saved data (in megabytes) as JSON::
+
+    python test/bench_binary_ast.py [--size 0.2] [--repeat 5]
+"""
+
+from __future__ import division, print_function
+
+import os
+import sys
+import json
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_parse_file import make_source, best_time  # noqa
+
+
+def measure(ast, repeat):
+    from pycparserext import binary_ast
+
+    results = {}
+    for name, dumps, loads in [
+            ("pickle",
+                lambda ast: pickle.dumps(ast, pickle.HIGHEST_PROTOCOL),
+                pickle.loads),
+            ("binary_ast", binary_ast.dumps, binary_ast.loads),
+            ]:
+        data = dumps(ast)
+        dump_time = best_time(lambda: dumps(ast), repeat)
+        load_time = best_time(lambda: loads(data), repeat)
+        results[name] = {
+                "dump": dump_time,
+                "load": load_time,
+                "size_mb": len(data) / 1e6,
+                }
+    return results
+
+
+def main():
+    from argparse import ArgumentParser
+    from pycparserext.ext_c_parser import GnuCParser
+    from pycparserext.compact_ast import compact
+
+    parser = ArgumentParser()
+    parser.add_argument("--size", type=float, default=0.2,
+            help="size of the source file in megabytes")
+    parser.add_argument("--repeat", type=int, default=5,
+            help="number of runs to take the best time of")
+    args = parser.parse_args()
+
+    text = make_source(args.size * 1e6)
+
+    results = {}
+    for name, node_factory in [("regular", None), ("compact", compact)]:
+        ast = GnuCParser(node_factory=node_factory).parse(text)
+        results[name] = measure(ast, args.repeat)
+
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Memory benchmark for :mod:`pycparserext.compact_ast`.
+
+For each node class of :mod:`pycparser.c_ast` and of
+:mod:`pycparserext.ext_c_parser`, measures the memory taken by a node with
+all fields set to *None*, as a regular and as a compact node. Then
+measures the memory and parse time of the AST of about ``--size`` megabytes
+of GNU C with each combination of ``node_factory=compact`` and
+``share_subtrees=True``. Prints bytes per node, and megabytes and seconds
+per AST, as JSON::
+
+    python test/bench_compact_ast.py [--size 0.5] [--count 10000]
+
+Memory is measured with :mod:`tracemalloc`, so this needs Python 3.
+"""
+
+from __future__ import division, print_function
+
+import os
+import sys
+import json
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_parse_file import make_source  # noqa
+
+
+def node_classes():
+    import pycparser.c_ast as c_ast
+    import pycparserext.ext_c_parser as ext_c_parser
+
+    for module in [c_ast, ext_c_parser]:
+        for name, cls in sorted(vars(module).items()):
+            if (isinstance(cls, type) and issubclass(cls, c_ast.Node)
+                    and cls is not c_ast.Node and cls.__module__ == module.__name__):
+                yield cls
+
+
+def measure(make, count):
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    objects = [make() for i in range(count)]
+    size = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    del objects
+    return size / count
+
+
+def measure_nodes(count):
+    from pycparserext.compact_ast import compact_class, getargspec
+
+    results = {}
+    for cls in node_classes():
+        nargs = len(getargspec(cls.__init__).args) - 1
+        compact_cls = compact_class(cls)
+        results[cls.__name__] = {
+                "regular": measure(lambda: cls(*[None] * nargs), count),
+                "compact": measure(lambda: compact_cls(*[None] * nargs), count),
+                }
+    return results
+
+
+def measure_ast(size):
+    from pycparserext.ext_c_parser import GnuCParser
+    from pycparserext.compact_ast import compact
+
+    text = make_source(size)
+
+    results = {}
+    for name, node_factory, share_subtrees in [
+            ("regular", None, False),
+            ("compact", compact, False),
+            ("shared", None, True),
+            ("compact_shared", compact, True),
+            ]:
+        parser = GnuCParser(node_factory=node_factory,
+                share_subtrees=share_subtrees)
+
+        tracemalloc.start()
+        start_time = time.time()
+        ast = parser.parse(text)
+        elapsed = time.time() - start_time
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        results[name] = {"time": elapsed, "ast_mb": size / 1e6}
+        del ast
+
+    return results
+
+
+def main():
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument("--size", type=float, default=0.5,
+            help="size of the source file in megabytes")
+    parser.add_argument("--count", type=int, default=10000,
+            help="number of nodes to measure per class")
+    args = parser.parse_args()
+
+    print(json.dumps({
+        "nodes": measure_nodes(args.count),
+        "ast": measure_ast(int(args.size * 1e6)),
+        }, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Throughput benchmark for the OpenCL lexer.
+
+Lexes a synthetic, comment-heavy OpenCL kernel library of several megabytes
+with the PLY lexer and with the fast scanner of
+:class:`~pycparserext.ext_c_lexer.OpenCLCLexer`, and prints the time and
+throughput of each as JSON::
+
+    python test/bench_lexer.py [--kernels 4000]
+"""
+
+from __future__ import division, print_function
+
+import os
+import sys
+import json
+import time
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+LIBRARY_HEADER = """// Generated OpenCL kernel library
+#pragma OPENCL EXTENSION cl_khr_fp64 : enable
+#define TILE 16
+
+"""
+
+KERNEL_TEMPLATE = """// ---------------------------------------------------------------
+// kernel %(i)d: scaled accumulation with a %(i)d-element halo
+// see the design notes for the meaning of the coefficients
+// ---------------------------------------------------------------
+#define COEFF_%(i)d (%(i)d.5f)
+#ifdef USE_DOUBLE_%(i)d
+#define REAL_%(i)d double
+#endif
+kernel void acc_%(i)d(global float *restrict out, // output
+        global const float *in,   // input vector
+        const int n)              // number of elements
+{
+    int gid = get_global_id(0);   // one work item per element
+    float acc = 0.0f;
+    for (int k = 0; k < 4; ++k)   // unrolled by the compiler
+        acc += in[gid + k] * %(i)d.5f;
+    // write back, clamped
+    if (gid < n)
+        out[gid] = acc > 1e3f ? 1e3f : acc;
+}
+
+"""
+
+
+def make_library(kernels):
+    return LIBRARY_HEADER + "".join(
+            KERNEL_TEMPLATE % dict(i=i) for i in range(kernels))
+
+
+def main():
+    from argparse import ArgumentParser
+
+    from pycparser.c_lexer import CLexer
+    from pycparserext.ext_c_lexer import OpenCLCLexer
+
+    parser = ArgumentParser()
+    parser.add_argument("--kernels", type=int, default=4000)
+    args = parser.parse_args()
+
+    text = make_library(args.kernels)
+
+    clex = OpenCLCLexer(error_func=None, type_lookup_func=lambda name: False)
+    clex.build()
+
+    def count_tokens(token_func):
+        clex.input(text)
+        clex.reset_lineno()
+        count = 0
+        while token_func(clex) is not None:
+            count += 1
+        return count
+
+    results = {"bytes": len(text)}
+    for name, run in [
+            ("ply", lambda: count_tokens(CLexer.token)),
+            ("fast", lambda: count_tokens(OpenCLCLexer.token)),
+            ("tokenize", lambda: len(clex.tokenize(text))),
+            ]:
+        start = time.time()
+        tokens = run()
+        elapsed = time.time() - start
+        results[name] = {"tokens": tokens, "time": elapsed,
+                "mb_per_s": len(text) / elapsed / 1e6}
+
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Scaling benchmark for :mod:`pycparserext.parallel`.
+
+Parses a batch of synthetic GNU C translation units serially (with
+:meth:`~pycparserext.ext_c_parser.CParserBase.parse_many`) and with 1 to
+*max_workers* worker processes, and prints the wall time and speedup of
+each configuration as JSON::
+
+    python test/bench_parallel.py [--sources 400] [--max-workers N]
+"""
+
+from __future__ import division, print_function
+
+import os
+import sys
+import json
+import time
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+UNIT_HEADER = """
+typedef unsigned long size_t;
+"""
+
+UNIT_TEMPLATE = """
+extern void *memcpy (void *__restrict __dest, const void *__restrict __src,
+        size_t __n) __attribute__ ((__nothrow__)) __attribute__ ((__leaf__));
+struct point%(i)d { int x, y; };
+extern __inline int __attribute__ ((__nothrow__)) f%(i)d (float __x)
+{
+  int __m;
+  __asm ("pmovmskb %%1, %%0" : "=r" (__m) : "x" (__x));
+  return __m & 0x8;
+}
+static int dist%(i)d(struct point%(i)d a, struct point%(i)d b)
+{
+  int dx = a.x - b.x, dy = a.y - b.y;
+  return dx*dx + dy*dy;
+}
+"""
+
+
+def make_sources(count, unit_repeats=20):
+    return [
+            ("unit%d.c" % i, UNIT_HEADER + "".join(
+                UNIT_TEMPLATE % dict(i=j) for j in range(unit_repeats)))
+            for i in range(count)]
+
+
+def main():
+    from argparse import ArgumentParser
+
+    from pycparserext.ext_c_parser import GnuCParser
+    from pycparserext.parallel import parse_sources
+
+    try:
+        cpu_count = os.cpu_count()
+    except AttributeError:
+        from multiprocessing import cpu_count
+        cpu_count = cpu_count()
+
+    parser = ArgumentParser()
+    parser.add_argument("--sources", type=int, default=400)
+    parser.add_argument("--max-workers", type=int, default=cpu_count)
+    args = parser.parse_args()
+
+    sources = make_sources(args.sources)
+
+    start = time.time()
+    for name, result in GnuCParser().parse_many(sources):
+        assert not isinstance(result, Exception)
+    serial_time = time.time() - start
+
+    results = {"cpu_count": cpu_count, "sources": len(sources),
+            "serial": serial_time, "parallel": {}}
+
+    for workers in range(1, args.max_workers + 1):
+        start = time.time()
+        for name, result in parse_sources(sources, max_workers=workers):
+            assert not isinstance(result, Exception)
+        elapsed = time.time() - start
+        results["parallel"][workers] = {
+                "time": elapsed, "speedup": serial_time / elapsed}
+
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Peak memory benchmark for
+:meth:`~pycparserext.ext_c_parser.CParserBase.parse_file`.
+
+Writes a synthetic preprocessed GNU C file of about ``--size`` megabytes,
+then measures the peak resident set size of a fresh interpreter that
+
+* ``read.load`` reads the file with :func:`io.open` and ``read()``,
+* ``read.parse`` does the same and then parses the text,
+* ``parse_file.load`` decodes the file from a memory mapping, as
+  :meth:`parse_file` does,
+* ``parse_file.parse`` calls :meth:`parse_file`,
+
+and prints the results (in megabytes, along with the wall time) as JSON::
+
+    python test/bench_parse_file.py [--size 2]
+
+Resident set sizes are taken from :func:`resource.getrusage`, so this only
+runs on Unix.
+
+The other benchmarks import :func:`make_source` and :func:`best_time` from
+here.
+"""
+
+from __future__ import division, print_function
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import subprocess
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+UNIT_TEMPLATE = """
+# %(line)d "/usr/include/unit%(i)d.h" 3 4
+typedef unsigned long size%(i)d_t;
+extern void *memcpy%(i)d (void *__restrict __dest,
+        const void *__restrict __src,
+        size%(i)d_t __n) __attribute__ ((__nothrow__)) __attribute__ ((__leaf__));
+
+
+
+struct point%(i)d { int x, y; };
+static int dist%(i)d(struct point%(i)d a, struct point%(i)d b)
+{
+  int dx = a.x - b.x, dy = a.y - b.y;
+  return dx*dx + dy*dy;
+}
+"""
+
+MEASURE_SCRIPT = """
+import sys, io, time, json, resource
+sys.path.insert(0, %(root)r)
+from pycparserext.ext_c_parser import GnuCParser, _read_mapped_file
+
+parser = GnuCParser()
+start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+start = time.time()
+if %(method)r == "read":
+    with io.open(%(path)r, encoding="utf-8") as inf:
+        text = inf.read()
+    if %(parse)r:
+        ast = parser.parse(text, %(path)r)
+else:
+    if %(parse)r:
+        ast = parser.parse_file(%(path)r)
+    else:
+        text = _read_mapped_file(%(path)r, "utf-8")
+elapsed = time.time() - start
+
+# kilobytes on Linux, bytes on macOS
+scale = 1024 if sys.platform == "darwin" else 1
+print(json.dumps({
+    "time": elapsed,
+    "peak_rss_mb": resource.getrusage(
+        resource.RUSAGE_SELF).ru_maxrss / scale / 1024,
+    "start_rss_mb": start_rss / scale / 1024,
+    }))
+"""
+
+
+def make_source(size):
+    """Return synthetic preprocessed GNU C source of about *size*
+    characters, made of :data:`UNIT_TEMPLATE` repeated.
+    """
+    units = []
+    written = 0
+    while written < size:
+        units.append(UNIT_TEMPLATE % dict(i=len(units), line=len(units) + 1))
+        written += len(units[-1])
+    return "".join(units)
+
+
+def best_time(func, repeat):
+    """Return the shortest wall time of *repeat* calls of *func*."""
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def write_source(path, size):
+    with open(path, "w") as outf:
+        outf.write(make_source(size))
+
+
+def measure(path, method, parse):
+    output = subprocess.check_output([sys.executable, "-c",
+        MEASURE_SCRIPT % dict(
+            root=ROOT, path=path, method=method, parse=parse)])
+    return json.loads(output.decode())
+
+
+def main():
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument("--size", type=float, default=2,
+            help="size of the source file in megabytes")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, "big.i")
+        write_source(path, int(args.size * 1e6))
+
+        results = {"size_mb": os.path.getsize(path) / 1e6}
+        for method in ["read", "parse_file"]:
+            for parse in [False, True]:
+                results["%s.%s" % (method, "parse" if parse else "load")] = \
+                        measure(path, method, parse)
+    finally:
+        shutil.rmtree(tmpdir)
+
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""Startup and import-time benchmarks.
+
+Every sample is taken in a fresh interpreter, so that module and table
+caches inside the process do not hide cold-start costs. Measured are
+
+* ``import.<module>``: importing :mod:`pycparserext.ext_c_parser`,
+  :mod:`pycparserext.ext_c_generator` and :mod:`typechecker` (the latter
+  including its generated builtin tables),
+* ``<parser>.construct``: the first construction of each parser class,
+* ``<parser>.first_parse``: the first parse with that instance,
+* ``<parser>.steady_parse``: the median of further parses of the same code.
+
+Results are written as JSON. Passing a previous result file as
+``--compare`` makes the script exit with status 1 if any measurement
+slowed down by more than ``--tolerance`` (relative)::
+
+    python test/bench_startup.py --output baseline.json
+    python test/bench_startup.py --compare baseline.json
+"""
+
+from __future__ import division, print_function
+
+import os
+import sys
+import json
+import platform
+import subprocess
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORTED_MODULES = [
+        "pycparserext.ext_c_parser",
+        "pycparserext.ext_c_generator",
+        "typechecker",
+        ]
+
+GNU_SOURCE = """
+typedef unsigned long size_t;
+extern __inline int __attribute__ ((__nothrow__)) __signbitf (float __x)
+{
+  int __m;
+  __asm ("pmovmskb %1, %0" : "=r" (__m) : "x" (__x));
+  return __m & 0x8;
+}
+extern void *memcpy (void *__restrict __dest, const void *__restrict __src,
+        size_t __n) __attribute__ ((__nothrow__)) __attribute__ ((__leaf__));
+struct point { int x, y; };
+static int dist2(struct point a, struct point b)
+{
+  int dx = a.x - b.x, dy = a.y - b.y;
+  return dx*dx + dy*dy;
+}
+"""
+
+OPENCL_SOURCE = """
+// saxpy and friends
+#define N 16
+kernel void saxpy(global float *y, global const float *x, float a)
+{
+  int i = get_global_id(0);
+  y[i] = a*x[i] + y[i];
+}
+
+kernel void sum4(global float4 *out, global const float4 *in, int n)
+{
+  float4 acc = 0;
+  for (int i = 0; i < n; ++i)
+    acc += in[i];
+  out[get_global_id(0)] = acc;
+}
+"""
+
+PARSER_SOURCES = {
+        "GnuCParser": GNU_SOURCE,
+        "OpenCLCParser": OPENCL_SOURCE,
+        }
+
+IMPORT_SCRIPT = """
+import sys, time, json
+start = time.time()
+import %(module)s
+sys.stdout.write(json.dumps({"import.%(module)s": time.time() - start}))
+"""
+
+PARSER_SCRIPT = """
+import sys, time, json
+from pycparserext.ext_c_parser import %(cls)s
+src = %(src)r
+result = {}
+
+start = time.time()
+p = %(cls)s()
+result["%(cls)s.construct"] = time.time() - start
+
+start = time.time()
+p.parse(src)
+result["%(cls)s.first_parse"] = time.time() - start
+
+times = []
+for i in range(%(steady_reps)d):
+    start = time.time()
+    p.parse(src)
+    times.append(time.time() - start)
+times.sort()
+result["%(cls)s.steady_parse"] = times[len(times) // 2]
+
+sys.stdout.write(json.dumps(result))
+"""
+
+
+def run_child(script):
+    output = subprocess.check_output([sys.executable, "-c", script], cwd=ROOT)
+    return json.loads(output.decode("utf-8"))
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def run_benchmarks(repetitions, steady_reps):
+    scripts = [IMPORT_SCRIPT % dict(module=module)
+            for module in IMPORTED_MODULES]
+    scripts.extend(
+            PARSER_SCRIPT % dict(cls=cls, src=src, steady_reps=steady_reps)
+            for cls, src in sorted(PARSER_SOURCES.items()))
+
+    samples = {}
+    for script in scripts:
+        for i in range(repetitions):
+            for name, value in run_child(script).items():
+                samples.setdefault(name, []).append(value)
+
+    return dict(
+            (name, {"min": min(values), "median": median(values)})
+            for name, values in samples.items())
+
+
+def find_regressions(results, baseline, tolerance):
+    regressions = []
+    for name, stats in sorted(results.items()):
+        if name not in baseline:
+            continue
+        old = baseline[name]["min"]
+        new = stats["min"]
+        if new > old * (1 + tolerance):
+            regressions.append((name, old, new))
+    return regressions
+
+
+def main():
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repetitions", type=int, default=5,
+            help="fresh interpreters per measurement")
+    parser.add_argument("--steady-reps", type=int, default=20,
+            help="parses per steady-state measurement")
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--compare", metavar="BASELINE",
+            help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = {
+            "python": platform.python_version(),
+            "results": run_benchmarks(args.repetitions, args.steady_reps),
+            }
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as outf:
+            outf.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as inf:
+            baseline = json.load(inf)["results"]
+
+        regressions = find_regressions(
+                results["results"], baseline, args.tolerance)
+        for name, old, new in regressions:
+            sys.stderr.write("REGRESSION %s: %.2f ms -> %.2f ms\n"
+                    % (name, old*1000, new*1000))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
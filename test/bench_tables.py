@@ -0,0 +1,75 @@
+"""Cold-start benchmark for parser construction.
+
+Each measurement runs in a fresh interpreter and times the first
+construction of a parser class, with its LALR tables coming from
+
+* ``runtime``: generation from the grammar (the behavior before table
+  caching),
+* ``disk-cache``: a warm :func:`pycparserext.ext_c_parser.get_table_cache_dir`,
+* ``shipped``: the modules written by :mod:`pycparserext._build_tables`.
+
+Usage::
+
+    python test/bench_tables.py [repetitions]
+"""
+
+from __future__ import division, print_function
+
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD_SCRIPT = """
+import sys, time
+from pycparserext.ext_c_parser import %(cls)s
+if %(no_shipped)s:
+    %(cls)s.yacctab = None
+start = time.time()
+%(cls)s(table_cache_dir=%(cache_dir)r)
+sys.stdout.write(repr(time.time() - start))
+"""
+
+
+def time_construction(parser_class_name, cache_dir, no_shipped):
+    script = CHILD_SCRIPT % dict(
+            cls=parser_class_name, cache_dir=cache_dir, no_shipped=no_shipped)
+    output = subprocess.check_output([sys.executable, "-c", script], cwd=ROOT)
+    return float(output)
+
+
+def main(repetitions=5):
+    repetitions = int(repetitions)
+
+    subprocess.check_call(
+            [sys.executable, "-m", "pycparserext._build_tables"], cwd=ROOT)
+
+    cache_dir = tempfile.mkdtemp()
+    try:
+        configs = [
+                ("runtime", "", True),
+                ("disk-cache", cache_dir, True),
+                ("shipped", "", False),
+                ]
+
+        for parser_class_name in ["GnuCParser", "OpenCLCParser"]:
+            # warm the disk cache
+            time_construction(parser_class_name, cache_dir, True)
+
+            for config_name, config_cache_dir, no_shipped in configs:
+                best = min(
+                        time_construction(
+                            parser_class_name, config_cache_dir, no_shipped)
+                        for i in range(repetitions))
+                print("%-14s %-11s %8.1f ms" % (
+                    parser_class_name, config_name, best*1000))
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,82 @@
+"""Speed benchmark for :mod:`pycparserext.walk`.
+
+Times how long it takes to visit every node of an AST of about ``--size``
+megabytes of GNU C, made of regular and of compact nodes, five ways:
+recursing through ``children()`` as :class:`pycparser.c_ast.NodeVisitor`
+does, looping over ``children()`` with a stack, and calling
+:func:`pycparserext.walk.walk` in pre-order, in post-order and for
+:class:`pycparser.c_ast.ID` nodes only. Prints the best of ``--repeat``
+runs of each (in seconds) as JSON::
+
+    python test/bench_walk.py [--size 0.5] [--repeat 5]
+"""
+
+from __future__ import division, print_function
+
+import os
+import sys
+import json
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_parse_file import make_source, best_time  # noqa
+
+
+def walk_recursive(node):
+    for name, child in node.children():
+        walk_recursive(child)
+
+
+def walk_children(node):
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        stack.extend(child for name, child in node.children())
+
+
+def measure(ast, repeat):
+    from pycparser import c_ast
+    from pycparserext.walk import walk
+
+    def consume(nodes):
+        for node in nodes:
+            pass
+
+    return {
+            "recursive_children": best_time(
+                lambda: walk_recursive(ast), repeat),
+            "iterative_children": best_time(
+                lambda: walk_children(ast), repeat),
+            "walk_pre": best_time(lambda: consume(walk(ast)), repeat),
+            "walk_post": best_time(
+                lambda: consume(walk(ast, "post")), repeat),
+            "walk_ids": best_time(
+                lambda: consume(walk(ast, node_class=c_ast.ID)), repeat),
+            }
+
+
+def main():
+    from argparse import ArgumentParser
+    from pycparserext.ext_c_parser import GnuCParser
+    from pycparserext.compact_ast import compact
+
+    parser = ArgumentParser()
+    parser.add_argument("--size", type=float, default=0.5,
+            help="size of the source file in megabytes")
+    parser.add_argument("--repeat", type=int, default=5,
+            help="number of runs to take the best time of")
+    args = parser.parse_args()
+
+    text = make_source(args.size * 1e6)
+
+    results = {}
+    for name, node_factory in [("regular", None), ("compact", compact)]:
+        ast = GnuCParser(node_factory=node_factory).parse(text)
+        results[name] = measure(ast, args.repeat)
+
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
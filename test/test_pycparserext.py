@@ -13,7 +13,1168 @@ def test_funky_header_code():
     ast = p.parse(src)
 
     from pycparserext.ext_c_generator import GnuCGenerator
-    print GnuCGenerator().visit(ast)
+    print(GnuCGenerator().visit(ast))
+
+
+def test_table_cache(tmpdir, monkeypatch):
+    import os
+    from pycparserext.ext_c_parser import GnuCParser
+    from pycparserext.ext_c_generator import GnuCGenerator
+
+    monkeypatch.setattr(GnuCParser, "yacctab", None)
+
+    src = "int x __attribute__((aligned(4))); int f(int a) { return a; }"
+    cache_dir = str(tmpdir)
+
+    p = GnuCParser(table_cache_dir=cache_dir)
+    cache_files = os.listdir(cache_dir)
+    assert len(cache_files) == 1
+    assert GnuCParser.grammar_fingerprint() in cache_files[0]
+
+    cached_p = GnuCParser(table_cache_dir=cache_dir)
+    assert os.listdir(cache_dir) == cache_files
+    assert (GnuCGenerator().visit(cached_p.parse(src))
+            == GnuCGenerator().visit(p.parse(src)))
+
+    class ModifiedGnuCParser(GnuCParser):
+        def p_unary_operator_gnu(self, p):
+            """ unary_operator  : __REAL__
+            """
+            p[0] = p[1]
+
+    assert (ModifiedGnuCParser.grammar_fingerprint()
+            != GnuCParser.grammar_fingerprint())
+
+    # cache files are replaced, and failed writes leave nothing behind
+    from pycparserext import ext_c_parser
+
+    cache_file = os.path.join(cache_dir, cache_files[0])
+    ext_c_parser._write_cache_file(cache_file, b"data")
+    with open(cache_file, "rb") as inf:
+        assert inf.read() == b"data"
+
+    def fail(src, dst):
+        raise OSError("cannot replace")
+
+    monkeypatch.setattr(ext_c_parser, "_replace_file", fail)
+    ext_c_parser._write_cache_file(cache_file, b"other")
+    assert os.listdir(cache_dir) == cache_files
+
+
+def test_shipped_tables(tmpdir, monkeypatch):
+    from pycparserext import _build_tables
+    from pycparserext.ext_c_parser import GnuCParser
+
+    _build_tables.build_tables(str(tmpdir))
+    monkeypatch.syspath_prepend(str(tmpdir))
+
+    class ShippedGnuCParser(GnuCParser):
+        yacctab = "gnu_yacctab"
+
+    def fail(self, yacc_debug):
+        raise AssertionError("tables were regenerated")
+
+    monkeypatch.setattr(GnuCParser, "_generate_parse_tables", fail)
+
+    ast = ShippedGnuCParser(table_cache_dir="").parse("int x;")
+    assert ast.ext[0].name == "x"
+
+    class ModifiedGnuCParser(ShippedGnuCParser):
+        def p_unary_operator_gnu(self, p):
+            """ unary_operator  : __REAL__
+            """
+            p[0] = p[1]
+
+    import pytest
+    with pytest.raises(AssertionError):
+        ModifiedGnuCParser(table_cache_dir="")
+
+
+def test_parser_registry():
+    from pycparserext.ext_c_parser import OpenCLCParser
+    from pycparserext.registry import ParserRegistry
+
+    registry = ParserRegistry()
+    p1 = registry.get_parser(OpenCLCParser)
+    p2 = registry.get_parser(OpenCLCParser)
+    assert p1 is not p2
+    assert p1.parse_tables is p2.parse_tables
+
+    # sessions must not share typedef scopes or lexer state
+    ast1 = p1.parse("typedef int my_t; my_t x;")
+    assert ast1.ext[1].type.type.names == ["my_t"]
+    import pytest
+    from pycparser.plyparser import ParseError
+    with pytest.raises(ParseError):
+        p2.parse("my_t x;")
+
+    ast2 = p2.parse("kernel void f(global float4 *a)\n{\n  a[0] = 1;\n}\n"
+            "\nfloat4 b;\n")
+    assert ast2.ext[1].coord.line == 6
+
+
+def test_lexer_build_cache():
+    from pycparserext.ext_c_lexer import OpenCLCLexer
+
+    def make_lexer():
+        clex = OpenCLCLexer(
+                error_func=None, type_lookup_func=lambda name: False)
+        clex.build()
+        return clex
+
+    clex1 = make_lexer()
+    clex2 = make_lexer()
+    assert clex1.lexer is not clex2.lexer
+    assert clex1.lexer.lexstatere["INITIAL"][0][0] \
+            is clex2.lexer.lexstatere["INITIAL"][0][0]
+
+    def lex(clex, text):
+        clex.input(text)
+        result = []
+        while True:
+            tok = clex.token()
+            if tok is None:
+                return result
+            result.append((tok.type, tok.value, tok.lineno))
+
+    src = "kernel void f() // comment\n{ global int x = 0x1f; }\n"
+    clex2.input("int y;")
+    clex2.token()
+    assert lex(clex1, src) == [
+            ("KERNEL", "kernel", 1), ("VOID", "void", 1), ("ID", "f", 1),
+            ("LPAREN", "(", 1), ("RPAREN", ")", 1), ("LBRACE", "{", 2),
+            ("GLOBAL", "global", 2), ("INT", "int", 2), ("ID", "x", 2),
+            ("EQUALS", "=", 2), ("INT_CONST_HEX", "0x1f", 2),
+            ("SEMI", ";", 2), ("RBRACE", "}", 2)]
+
+
+def test_parse_many():
+    from pycparserext.ext_c_parser import OpenCLCParser
+    from pycparser.plyparser import ParseError
+
+    sources = [
+            ("a.cl", "typedef int my_t;\nmy_t x;"),
+            ("b.cl", "int y;\nint z = ;"),
+            ("c.cl", "\n\nfloat4 w;"),
+            ("d.cl", "my_t v;"),
+            ("e.cl", ""),
+            ]
+
+    results = OpenCLCParser().parse_many(iter(sources))
+    assert not isinstance(results, list)
+    results = list(results)
+
+    assert [name for name, result in results] == [
+            name for name, text in sources]
+
+    assert results[0][1].ext[1].type.type.names == ["my_t"]
+    assert isinstance(results[1][1], ParseError)
+    assert "b.cl:2" in str(results[1][1])
+
+    w_decl = results[2][1].ext[0]
+    assert w_decl.coord.file == "c.cl"
+    assert w_decl.coord.line == 3
+
+    # typedefs do not leak from one source into the next
+    assert isinstance(results[3][1], ParseError)
+    assert results[4][1].ext == []
+
+
+GNU_PICKLE_SRC = """
+extern __inline int __attribute__ ((__nothrow__)) __signbitf (float __x)
+{
+  int __m;
+  __asm ("pmovmskb %1, %0" : "=r" (__m) : "x" (__x));
+  __typeof__(__m) a = __builtin_types_compatible_p(int, long);
+  __typeof__(int) b;
+  return __m & 0x8;
+}
+"""
+
+
+from pycparserext.ext_c_parser import TypeOfExpression  # noqa
+
+
+class MyTypeOfExpression(TypeOfExpression):
+    # at module level, so that pickle finds it
+    pass
+
+
+def test_pickle_ext_nodes():
+    import pickle
+    from pycparserext.ext_c_parser import GnuCParser, OpenCLCParser
+    from pycparserext.ext_c_generator import GnuCGenerator, OpenCLCGenerator
+
+    ast = GnuCParser().parse(GNU_PICKLE_SRC)
+    ast2 = pickle.loads(pickle.dumps(ast, 2))
+    assert GnuCGenerator().visit(ast2) == GnuCGenerator().visit(ast)
+    assert ast2.ext[0].coord.line == ast.ext[0].coord.line
+
+    ast = OpenCLCParser().parse("#define N 4\nkernel void f() {}\n")
+    ast2 = pickle.loads(pickle.dumps(ast, 2))
+    assert OpenCLCGenerator().visit(ast2) == OpenCLCGenerator().visit(ast)
+    assert ast2.ext[0].coord.line == 1
+
+    # subclasses pickle as themselves
+    from pycparser import c_ast
+    expr = MyTypeOfExpression(c_ast.ID("x"))
+    expr2 = pickle.loads(pickle.dumps(expr, 2))
+    assert type(expr2) is MyTypeOfExpression
+    assert expr2.expr.name == "x"
+
+
+def test_parse_parallel(tmpdir):
+    import pytest
+    pytest.importorskip("concurrent.futures")
+
+    from pycparserext.ext_c_parser import OpenCLCParser
+    from pycparserext.parallel import parse_sources, parse_files
+    from pycparser.plyparser import ParseError
+
+    sources = [("f%d.cl" % i, "int x%d;" % i) for i in range(20)]
+    sources[7] = ("f7.cl", "int = ;")
+
+    results = list(parse_sources(
+        sources, OpenCLCParser, max_workers=2, chunksize=3))
+    assert [name for name, result in results] == [
+            name for name, text in sources]
+    assert isinstance(results[7][1], ParseError)
+    assert results[8][1].ext[0].name == "x8"
+
+    filenames = []
+    for i in range(3):
+        filename = str(tmpdir.join("f%d.c" % i))
+        with open(filename, "w") as outf:
+            outf.write("int y%d;" % i)
+        filenames.append(filename)
+
+    results = list(parse_files(filenames, max_workers=2))
+    assert [ast.ext[0].coord.file for name, ast in results] == filenames
+
+
+def test_parse_stream():
+    from pycparserext.ext_c_parser import GnuCParser
+    from pycparserext.ext_c_generator import GnuCGenerator
+    from pycparser.plyparser import ParseError
+    import pytest
+
+    src = GNU_PICKLE_SRC + """
+    ;
+    typedef struct { int x; } point_t;
+    point_t origin, *pp;
+    int dist(point_t a) { return a.x; }
+    """
+
+    p = GnuCParser()
+    stream = p.parse_stream(src, filename="s.c")
+    first = next(stream)
+    assert first.decl.name == "__signbitf"
+
+    decls = [first] + list(stream)
+    ast = p.parse(src, filename="s.c")
+    assert len(decls) == len(ast.ext)
+
+    gen = GnuCGenerator()
+    for streamed, full in zip(decls, ast.ext):
+        assert gen.visit(streamed) == gen.visit(full)
+        assert str(streamed.coord) == str(full.coord)
+
+    # the typedef stays in scope after streaming
+    assert p._is_type_in_scope("point_t")
+
+    assert list(p.parse_stream("  ")) == []
+
+    stream = p.parse_stream("int a;\nint b = ;\n")
+    assert next(stream).name == "a"
+    with pytest.raises(ParseError):
+        next(stream)
+
+
+def test_incremental_reparse():
+    from pycparserext.ext_c_parser import OpenCLCParser
+    from pycparserext.ext_c_generator import OpenCLCGenerator
+    from pycparserext.incremental import IncrementalParser
+    from pycparser.plyparser import ParseError
+    import pytest
+
+    src = (
+            "typedef float real_t;\n"
+            "kernel void f(global real_t *a)\n{\n  a[0] = 1;\n}\n"
+            "real_t g(real_t x)\n{\n  return x;\n}\n"
+            "typedef int idx_t;\n"
+            "idx_t h;\n")
+
+    def check(inc):
+        full = OpenCLCParser().parse(inc.text, filename="p.cl")
+        assert (OpenCLCGenerator().visit(inc.ast)
+                == OpenCLCGenerator().visit(full))
+        assert ([str(decl.coord) for decl in inc.ast.ext]
+                == [str(decl.coord) for decl in full.ext])
+
+    inc = IncrementalParser(OpenCLCParser(), src, "p.cl")
+    check(inc)
+    old_ext = inc.ast.ext
+
+    # insert two lines into the body of f
+    pos = inc.text.index("a[0] = 1;")
+    inc.edit(pos, pos, "a[1] = 2;\n\n")
+    check(inc)
+    assert inc.ast.ext[0] is old_ext[0]
+    assert inc.ast.ext[1] is not old_ext[1]
+    assert inc.ast.ext[2:] == old_ext[2:]
+    assert inc.ast.ext[2].coord.line == 8
+
+    # an edit that breaks the source, then one that repairs it
+    pos = inc.text.index("return x;")
+    with pytest.raises(ParseError):
+        inc.edit(pos, pos + len("return x;"), "return x")
+    inc.edit(pos, pos + len("return x"), "return 2*x;")
+    check(inc)
+    assert inc.ast.ext[-1] is old_ext[-1]
+
+    # removing a typedef reparses its users
+    pos = inc.text.index("typedef int idx_t;")
+    with pytest.raises(ParseError):
+        inc.edit(pos, pos + len("typedef int idx_t;"), "")
+    inc.edit(pos, pos, "typedef long idx_t;")
+    check(inc)
+    assert inc.ast.ext[-1] is not old_ext[-1]
+
+
+def test_incremental_reparse_random_edits():
+    import random
+    from pycparserext.ext_c_parser import GnuCParser
+    from pycparserext.ext_c_generator import GnuCGenerator
+    from pycparserext.incremental import IncrementalParser
+    from pycparser.plyparser import ParseError
+    import pytest
+
+    # A failed edit must not let the next one reuse the broken declaration.
+    inc = IncrementalParser(GnuCParser(), "int a;\nint b;\nint c;\n")
+    with pytest.raises(ParseError):
+        inc.edit(9, 10, " ")
+    with pytest.raises(ParseError):
+        inc.edit(0, 0, " ")
+
+    def result(parse):
+        try:
+            ast = parse()
+        except Exception:
+            return None
+        return (GnuCGenerator().visit(ast),
+                [str(decl.coord) for decl in ast.ext])
+
+    src = ("typedef int T;\nint a;\nT b;\nint f(T x) { return x; }\n"
+            "struct s { T m; };\nint c;\n")
+    pieces = ["", " ", "\n", ";", "int", "T", "x", "typedef int U;", "}",
+            "{", "(", "# 7\n", "int z;\n"]
+    rng = random.Random(1)
+    inc = IncrementalParser(GnuCParser(), src)
+    for step in range(500):
+        start = rng.randint(0, len(inc.text))
+        end = min(len(inc.text), start + rng.randint(0, 4))
+        replacement = rng.choice(pieces)
+        text = inc.text[:start] + replacement + inc.text[end:]
+
+        assert (result(lambda: inc.edit(start, end, replacement))
+                == result(lambda: GnuCParser().parse(text)))
+
+        if len(inc.text) > 300:
+            inc = IncrementalParser(GnuCParser(), src)
+
+
+def test_parse_cache(tmpdir):
+    from pycparserext.ext_c_parser import OpenCLCParser
+    from pycparserext.ext_c_generator import OpenCLCGenerator
+    from pycparserext.parse_cache import ParseCache
+
+    src = "kernel void f(global my_t *a)\n{\n  a[0] = 1;\n}\n"
+    cache = ParseCache(cache_dir=str(tmpdir))
+    p = OpenCLCParser(parse_cache=cache)
+
+    ast1 = p.parse(src, initial_type_symbols=["my_t"])
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    ast1.ext[0].decl.name = "g"
+    ast2 = p.parse(src, initial_type_symbols=["my_t"])
+    assert (cache.memory_hits, cache.misses) == (1, 1)
+    assert ast2.ext[0].decl.name == "f"
+    assert ast2.ext[0].coord.line == 1
+
+    p.parse(src, filename="other.cl", initial_type_symbols=["my_t"])
+    p.parse(src, initial_type_symbols=["my_t", "other_t"])
+    assert cache.misses == 3
+
+    # a fresh cache finds the ASTs on disk
+    cache = ParseCache(cache_dir=str(tmpdir))
+    ast3 = OpenCLCParser(parse_cache=cache).parse(
+            src, initial_type_symbols=["my_t"])
+    assert (cache.disk_hits, cache.misses) == (1, 0)
+    assert OpenCLCGenerator().visit(ast3) == OpenCLCGenerator().visit(ast2)
+
+    # size-based eviction
+    import pickle
+    cache = ParseCache(
+            max_size=len(pickle.dumps(ast3, pickle.HIGHEST_PROTOCOL)) + 10)
+    p = OpenCLCParser(parse_cache=cache)
+    p.parse(src, initial_type_symbols=["my_t"])
+    p.parse(src, filename="b.cl", initial_type_symbols=["my_t"])
+    p.parse(src, filename="b.cl", initial_type_symbols=["my_t"])
+    p.parse(src, initial_type_symbols=["my_t"])
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_typechecker_include_cache(tmpdir, monkeypatch):
+    import pytest
+    if not hasattr(dict, "has_key"):
+        pytest.skip("the typechecker needs Python 2")
+
+    from pycparserext.parse_cache import ParseCache
+    from typechecker import TypeChecker, Context
+
+    tmpdir.join("h.h").write("int g;\n")
+    monkeypatch.setenv("ACE_OCL_INCLUDES", str(tmpdir))
+
+    cache = ParseCache()
+    tc = TypeChecker(parse_cache=cache)
+    tc.check('#include "h.h"\nint x;\n', Context())
+    assert (cache.hits, cache.misses) == (0, 2)
+
+    # the header is served from the cache
+    tc.check('#include "h.h"\nint y;\n', Context())
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_opencl_fast_lexer():
+    from pycparser.c_lexer import CLexer
+    from pycparserext.ext_c_lexer import OpenCLCLexer
+
+    src = r"""// header comment
+#pragma OPENCL EXTENSION cl_khr_fp64 : enable
+  #define A(x) \
+      ((x) + 1)
+kernel void f(global my_t *a, // first arg
+        const char *s)
+{
+    a[0] = 0x1fu + .5f + 1e3 + 077 + L'x' + '\n';
+    s = "not // a comment, # nor a directive" L"wide";
+    a[1] >>= 2; a[2] /= 3 / 4;
+}
+"""
+
+    def lex(text, token_func):
+        errors = []
+        clex = OpenCLCLexer(
+                error_func=lambda msg, line, col: errors.append((msg, line)),
+                type_lookup_func=lambda name: name == "my_t")
+        clex.build()
+        clex.input(text)
+        clex.reset_lineno()
+        result = []
+        while True:
+            tok = token_func(clex)
+            if tok is None:
+                return result, errors, clex.lexer.lexpos
+            result.append((tok.type, tok.value, tok.lineno, tok.lexpos))
+
+    for text in [src, src + "x = 08 + '' + \"\\q\" @ y;\n", src + "'a"]:
+        fast = lex(text, OpenCLCLexer.token)
+        assert fast == lex(text, CLexer.token)
+
+    toks, errors, lexpos = fast
+    assert ("TYPEID", "my_t", 5, src.index("my_t")) in toks
+    assert ("PPHASH", "#define A(x) \\\n      ((x) + 1)\n", 3,
+            src.index("#define")) in toks
+    assert "LINECOMMENT" not in [tok[0] for tok in toks]
+
+    clex = OpenCLCLexer(error_func=None, type_lookup_func=None)
+    clex.build()
+    assert [(tok.type, tok.value, tok.lineno, tok.lexpos)
+            for tok in clex.tokenize(src)] == [
+                    tok if tok[0] != "TYPEID" else ("ID",) + tok[1:]
+                    for tok in lex(src, OpenCLCLexer.token)[0]]
+
+
+def coords(ast):
+    """Return the coordinates of the nodes under *ast*, as ``(file, line)``
+    or *None*.
+    """
+    result = []
+    stack = [ast]
+    while stack:
+        node = stack.pop()
+        if node.coord is None:
+            result.append(None)
+        else:
+            result.append((node.coord.file, node.coord.line))
+        stack.extend(child for name, child in node.children())
+    return result
+
+
+def show(ast):
+    """Return the output of ``ast.show()`` with all details."""
+    try:
+        from StringIO import StringIO
+    except ImportError:
+        from io import StringIO
+
+    buf = StringIO()
+    ast.show(buf, attrnames=True, nodenames=True, showcoord=True)
+    return buf.getvalue()
+
+
+def test_token_stream(tmpdir):
+    from pycparserext.ext_c_parser import GnuCParser
+    from pycparserext.ext_c_lexer import TokenStream
+    from pycparserext.ext_c_generator import GnuCGenerator
+
+    src = """
+typedef int T;
+# 10 "foo.h"
+T x; int f(T a) { typedef float U; U b = a; return b; }
+#line 3 "bar.c"
+struct s { T t; } __attribute__((packed));
+static __inline int g(void) { __asm__("nop"); return "a" "b"[0]; }
+my_t y;
+"""
+
+    p = GnuCParser()
+    stream = p.clex.token_stream(src, "main.c")
+    assert stream.filename == "main.c"
+    assert stream.types.typecode == "B"
+
+    stream_file = tmpdir.join("main.tokens")
+    stream_file.write_binary(stream.dumps())
+    loaded = TokenStream.loads(stream_file.read_binary())
+
+    for s in [stream, loaded]:
+        ast = p.parse(src, "main.c", initial_type_symbols=["my_t"])
+        ast_from_tokens = p.parse_tokens(s, initial_type_symbols=["my_t"])
+        assert (GnuCGenerator().visit(ast_from_tokens)
+                == GnuCGenerator().visit(ast))
+        assert coords(ast_from_tokens) == coords(ast)
+        assert ("bar.c", 5) in coords(ast_from_tokens)
+
+    # identifiers are classified while parsing
+    import pytest
+    from pycparser.plyparser import ParseError
+    with pytest.raises(ParseError):
+        p.parse_tokens(stream)
+
+    assert p.parse_tokens(p.clex.token_stream("  \n")).ext == []
+
+
+def test_make_dialect(tmpdir):
+    from pycparserext.dialect import make_dialect
+    from pycparserext.ext_c_parser import (GnuCParser, FuncDeclExt,
+            _GnuMixin, _OpenCLMixin, _AttributesMixin, _AsmAndAttributesMixin)
+    import pycparser.c_ast as c_ast
+    from pycparserext.ext_c_generator import GnuCGenerator, OpenCLCGenerator
+
+    # the grammar of a built-in parser finds its shipped tables
+    gnu = make_dialect("GnuC", [_GnuMixin, _AsmAndAttributesMixin])
+    assert gnu.yacctab == GnuCParser.yacctab
+    assert gnu.grammar_fingerprint() == GnuCParser.grammar_fingerprint()
+
+    no_asm = make_dialect("GnuCNoAsm", [_GnuMixin, _AttributesMixin])
+    assert make_dialect("GnuCNoAsm", [_GnuMixin, _AttributesMixin]) is no_asm
+    assert "__ASM__" not in no_asm.lexer_class.tokens
+
+    p = no_asm(table_cache_dir=str(tmpdir))
+    assert no_asm(table_cache_dir=str(tmpdir)).parse_tables is p.parse_tables
+    ast = p.parse("""
+        int f(void) __attribute__((pure));
+        __typeof__(1) x;
+        void g() { __asm__("nop"); }
+        """)
+    assert isinstance(ast.ext[0].type, FuncDeclExt)
+    assert isinstance(ast.ext[2].body.block_items[0], c_ast.FuncCall)
+    assert "__attribute__((pure))" in GnuCGenerator().visit(ast)
+
+    # parsers written against _AttributesMixin keep plain function
+    # declarators
+    from pycparser.c_lexer import CLexer
+    from pycparserext.ext_c_lexer import add_lexer_keywords
+    from pycparserext.ext_c_parser import CParserBase
+
+    class AttributesLexer(CLexer):
+        pass
+
+    add_lexer_keywords(AttributesLexer, _AttributesMixin.lexer_keywords)
+
+    class AttributesParser(_AttributesMixin, CParserBase):
+        lexer_class = AttributesLexer
+
+    ast = AttributesParser(table_cache_dir=str(tmpdir)).parse(
+            "int __attribute__((unused)) x; int f(int);")
+    assert type(ast.ext[1].type) is c_ast.FuncDecl
+
+    class DeviceMixin(object):
+        lexer_keywords = ["__device__"]
+
+        def p_function_specifier_device(self, p):
+            """ function_specifier  : __DEVICE__
+            """
+            p[0] = p[1]
+
+    my_cl = make_dialect("MyCL",
+            [DeviceMixin, _OpenCLMixin, _AsmAndAttributesMixin],
+            initial_type_symbols=["my_t"])
+    src = "__device__ kernel void f(global my_t *a, float4 b)\n{\n}\n"
+    ast = my_cl(table_cache_dir=str(tmpdir)).parse(src)
+    assert OpenCLCGenerator().visit(ast) == src + "\n"
+
+
+def test_parse_file(tmpdir):
+    from pycparserext.ext_c_parser import GnuCParser
+    from pycparserext.ext_c_generator import GnuCGenerator
+
+    src = u'int x;\r\nchar *s = "h\u00e9";\r\n\r\nstruct s { int y; };\n'
+    path = tmpdir.join("a.c")
+    path.write_binary(src.encode("utf-8"))
+
+    p = GnuCParser()
+    ast = p.parse_file(str(path))
+    assert ast.ext[2].coord.file == str(path)
+    assert ast.ext[2].coord.line == 4
+
+    expected = src.replace(u"\r", u"")
+    if bytes is str:
+        # Python 2 parses byte strings
+        expected = expected.encode("utf-8")
+    assert (GnuCGenerator().visit(ast)
+            == GnuCGenerator().visit(p.parse(expected)))
+
+    if bytes is not str:
+        assert ast.ext[1].init.value == u'"h\u00e9"'
+        assert p.parse_file(str(path), encoding="latin-1",
+                filename="b.c").ext[1].init.value == u'"h\u00c3\u00a9"'
+
+    empty = tmpdir.join("empty.c")
+    empty.write("")
+    assert p.parse_file(str(empty)).ext == []
+
+    mixed = tmpdir.join("mixed.c")
+    mixed.write_binary(b"int x;\rint y;\r\n\r\rint z;\n")
+    ast = p.parse_file(str(mixed))
+    assert [ext.coord.line for ext in ast.ext] == [1, 2, 5]
+
+
+def test_coord_modes():
+    import pickle
+    from pycparser.plyparser import ParseError
+    from pycparserext.ext_c_parser import GnuCParser, LazyCoord
+    from pycparserext.walk import walk
+
+    src = """
+typedef int T;
+# 10 "foo.h"
+T x; int f(T a) { return a; }
+#line 3 "bar.c"
+  struct s { T t; } __attribute__((packed));
+"""
+
+    eager = coords(GnuCParser().parse(src, "main.c"))
+    lazy_ast = GnuCParser(coord_mode="lazy").parse(src, "main.c")
+    assert any(isinstance(node.coord, LazyCoord) for node in walk(lazy_ast))
+    assert coords(lazy_ast) == eager
+
+    member_coord = lazy_ast.ext[-1].type.decls[0].coord
+    assert (member_coord.line, member_coord.column) == (3, 16)
+    assert str(member_coord) == "bar.c:3:16"
+    unpickled = pickle.loads(pickle.dumps(member_coord))
+    assert (unpickled.file, unpickled.line, unpickled.column) == (
+            "bar.c", 3, 16)
+
+    assert (coords(GnuCParser(coord_mode="none").parse(src))
+            == [None] * len(eager))
+
+    for coord_mode in ["eager", "lazy", "none"]:
+        try:
+            GnuCParser(coord_mode=coord_mode).parse("int x;\nint y = ;", "e.c")
+        except ParseError as e:
+            assert str(e).startswith("e.c:2")
+        else:
+            assert False
+
+
+def test_skip_function_bodies():
+    import pickle
+    from pycparser import c_ast
+    from pycparser.plyparser import ParseError
+    from pycparserext.ext_c_parser import (
+            GnuCParser, OpenCLCParser, SkippedCompound)
+    from pycparserext.ext_c_generator import GnuCGenerator
+
+    src = """
+typedef int T;
+struct s { int a; union { T b; } u; };
+int arr[] = { 1, { 2 } };
+static inline int f(int x) __attribute__((unused));
+static inline int f(int x)
+{
+    typedef char U;
+    const char *s = "}{";
+    if (x) { return '}'; }
+    { U c = 1; }
+    return x;
+}
+int g(a) int a; { return a; }
+void h(void) {}
+T after;
+"""
+
+    def declarations(ast):
+        return [GnuCGenerator().visit(decl) for decl in ast.ext
+                if not isinstance(decl, c_ast.FuncDef)]
+
+    for parser_class in [GnuCParser, OpenCLCParser]:
+        full = parser_class().parse(src)
+        for coord_mode in ["eager", "lazy"]:
+            ast = parser_class(skip_function_bodies=True,
+                    coord_mode=coord_mode).parse(src, "a.c")
+            assert declarations(ast) == declarations(full)
+
+            bodies = [decl.body for decl in ast.ext
+                    if isinstance(decl, c_ast.FuncDef)]
+            assert all(isinstance(body, SkippedCompound) for body in bodies)
+            assert [src[body.start:body.end] for body in bodies] == [
+                    src[src.index("{\n    typedef"):src.index("int g")-1],
+                    "{ return a; }", "{}"]
+            assert [body.coord.line for body in bodies] == [7, 14, 15]
+
+    p = GnuCParser(skip_function_bodies=True)
+    stream = p.clex.token_stream(src)
+    ast = p.parse_tokens(stream)
+    spans = [(decl.body.start, decl.body.end) for decl in ast.ext
+            if isinstance(decl, c_ast.FuncDef)]
+    assert [end - start for start, end in spans] == [32, 5, 2]
+    for start, end in spans:
+        assert stream.type_names[stream.types[start]] == "LBRACE"
+        assert stream.type_names[stream.types[end - 1]] == "RBRACE"
+
+    ast = pickle.loads(pickle.dumps(ast))
+    assert (ast.ext[4].body.start, ast.ext[4].body.end) == spans[0]
+    assert GnuCGenerator().visit(ast.ext[6]) == "void h(void)\n{\n}\n\n"
+
+    try:
+        p.parse("int f(void) { { return 0; }\n")
+    except ParseError:
+        pass
+    else:
+        assert False
+
+
+def test_attribute_mode():
+    from pycparserext.ext_c_parser import GnuCParser, OpenCLCParser, Asm
+    from pycparserext.ext_c_generator import GnuCGenerator
+
+    src = """
+extern int printf (const char *__fmt, ...) __attribute__ ((__nonnull__ (1),
+        __format__ (__printf__, 1, 2)));
+extern int fstat (int __fd, void *__buf) __asm__ ("" "fst(at64")
+        __attribute__ ((__nothrow__ , __leaf__));
+struct s { int x __attribute__((aligned(16))); } __attribute__((packed));
+int f(int x) { __asm__("mov %1, %0" : "=r"(x) : "r"(x)); return x; }
+int y;
+"""
+    stripped = """
+extern int printf (const char *__fmt, ...);
+extern int fstat (int __fd, void *__buf);
+struct s { int x; };
+int f(int x) { ; return x; }
+int y;
+"""
+
+    gen = GnuCGenerator()
+    for parser_class in [GnuCParser, OpenCLCParser]:
+        for coord_mode in ["eager", "lazy"]:
+            p = parser_class(attribute_mode="strip", coord_mode=coord_mode)
+            ast = p.parse(src)
+            assert gen.visit(ast) == gen.visit(parser_class().parse(stripped))
+            assert ast.ext[-1].coord.line == 8
+
+            p = parser_class(attribute_mode="raw", coord_mode=coord_mode)
+            ast = p.parse(src)
+            assert ast.ext[-1].coord.line == 8
+            attrs = ast.ext[0].type.attributes.exprs
+            assert [attr.name for attr in attrs] == [
+                "__nonnull__ (1),\n        __format__ (__printf__, 1, 2)"]
+            assert gen.visit(ast.ext[1].type.asm) == \
+                    ' __asm__("" "fst(at64")'
+
+            # token streams keep no white space
+            stream = p.clex.token_stream(src)
+            ast = p.parse_tokens(stream)
+            assert [attr.name for attr in
+                    ast.ext[0].type.attributes.exprs] == [
+                        "__nonnull__(1), __format__(__printf__, 1, 2)"]
+            assert ast.ext[1].type.attributes.exprs[0].name == \
+                    "__nothrow__, __leaf__"
+            assert (ast.ext[2].type.decls[0].type.attributes.exprs[0].name
+                    == "aligned(16)")
+            asm = ast.ext[3].body.block_items[0]
+            assert isinstance(asm, Asm)
+            assert asm.template.exprs[0].name == \
+                    '"mov %1, %0":"=r"(x):"r"(x)'
+            assert gen.visit(p.parse_tokens(p.clex.token_stream(
+                "int x __attribute__((a(b - -c, d-- > 1, 'e' L\"f\")));"))) \
+                    == "int x __attribute__((a(b- -c, d-- >1, 'e' L\"f\")));\n"
+
+
+def test_prelude():
+    import pickle
+    from pycparserext.ext_c_parser import GnuCParser
+    from pycparserext.ext_c_generator import GnuCGenerator
+    from pycparserext.parse_cache import ParseCache
+
+    prelude_src = """
+typedef unsigned long size_t;
+struct point { int x, y; };
+static int dist(struct point a, struct point b)
+{ typedef int local_t; return a.x - b.x; }
+"""
+    src = """
+size_t n;
+int main(void) { struct point p; local_t = 1; return dist(p, p) + n; }
+"""
+
+    p = GnuCParser()
+    prelude = p.parse_prelude(prelude_src)
+    assert prelude.type_symbols == set(["size_t", "__builtin_va_list"])
+    assert len(prelude.ext) == 3
+
+    gen = GnuCGenerator()
+    expected = gen.visit(p.parse(prelude_src + src))
+    for prelude in [prelude, pickle.loads(pickle.dumps(prelude))]:
+        ast = p.parse(src, prelude=prelude)
+        assert gen.visit(ast) == expected
+        assert ast.ext[0] is prelude.ext[0]
+
+    cache = ParseCache()
+    p = GnuCParser(parse_cache=cache)
+    other_prelude = p.parse_prelude("typedef int size_t;")
+    assert other_prelude.key != prelude.key
+    p.parse(src, prelude=prelude)
+    assert len(p.parse(src, prelude=other_prelude).ext) == 3
+    ast = p.parse(src, prelude=prelude)
+    assert gen.visit(ast) == expected
+    assert cache.hits == 1
+    # cached results share the prelude's declarations too
+    assert ast.ext[0] is prelude.ext[0]
+
+
+def test_typedef_scope_stack():
+    from pycparserext.ext_c_parser import TypedefScopeStack, OpenCLCParser
+
+    base = frozenset(["size_t"])
+    scopes = TypedefScopeStack([base])
+    assert "size_t" in scopes
+    assert scopes.snapshot() is scopes.bases
+
+    scopes.add("T")
+    scopes.push()
+    scopes.add("T")
+    scopes.add("U")
+    assert len(scopes) == 2
+    assert "T" in scopes and "U" in scopes
+    scopes.pop()
+    assert "T" in scopes and "U" not in scopes
+
+    snapshot = scopes.snapshot()
+    assert scopes.snapshot() is snapshot
+    restored = TypedefScopeStack(snapshot)
+    assert restored.names() == frozenset(["size_t", "T"])
+    assert restored.snapshot() is snapshot
+
+    for i in range(10):
+        restored.add("T%d" % i)
+        restored = TypedefScopeStack(restored.snapshot())
+    assert len(restored.bases) <= TypedefScopeStack.max_bases
+    assert restored.bases[0] is base
+    assert "T9" in restored and "T" in restored
+
+    p = OpenCLCParser()
+    ast = p.parse("my_t x; float4 y;", initial_type_symbols=["my_t"])
+    assert ast.ext[0].type.type.names == ["my_t"]
+    assert p._scope_stack.bases[0] is p.initial_type_symbols
+
+
+def test_parse_batch():
+    from pycparser.plyparser import ParseError
+    from pycparserext.ext_c_parser import GnuCParser
+    from pycparserext.ext_c_generator import GnuCGenerator
+
+    prefix = """# 1 "/usr/include/a.h"
+typedef unsigned long size_t;
+struct point { int x, y; };
+static int dist(struct point a) { return a.x; }
+"""
+    sources = [
+            ("a.c", prefix + '# 1 "a.c"\nsize_t n;\n'),
+            ("b.c", prefix + '# 1 "b.c"\nint main(void) { return 0; }\n'),
+            ("c.c", prefix),
+            ("d.c", prefix + "int x = ;\n"),
+            ]
+
+    p = GnuCParser()
+    gen = GnuCGenerator()
+    results = list(p.parse_batch(sources))
+    expected = list(p.parse_many(sources))
+    assert [name for name, result in results] == ["a.c", "b.c", "c.c", "d.c"]
+
+    for (name, result), (_, expected_result) in zip(results[:3], expected):
+        assert gen.visit(result) == gen.visit(expected_result)
+        assert ([decl.coord.file for decl in result.ext]
+                == [decl.coord.file for decl in expected_result.ext])
+        assert result.ext[0] is results[0][1].ext[0]
+
+    assert isinstance(results[3][1], ParseError)
+    assert results[0][1].ext[-1].type.type.names == ["size_t"]
+    assert results[1][1].ext[-1].coord.file == "b.c"
+
+    # coordinates from the names of the sources are not shared
+    results = dict(p.parse_batch(
+        [("a.c", "typedef int T; T x;\n"), ("b.c", "typedef int T; T x;\n")]))
+    assert results["b.c"].ext[0].coord.file == "b.c"
+
+    # sources without tokens are errors unless they are blank
+    sources = [("e.c", '# 5 "h.h"\n'), ("f.c", " \n"), ("g.c", "")]
+    for batch in [sources, sources[:1]]:
+        results = list(p.parse_batch(batch))
+        expected = list(p.parse_many(batch))
+        assert ([type(result) for name, result in results]
+                == [type(result) for name, result in expected])
+    assert isinstance(results[0][1], ParseError)
+
+
+def test_compact_ast():
+    import pickle
+    from pycparser import c_ast
+    from pycparserext.ext_c_parser import GnuCParser, SkippedCompound
+    from pycparserext.ext_c_generator import GnuCGenerator
+    from pycparserext.compact_ast import compact, CompactNode
+
+    src = """
+typedef int T __attribute__((aligned(8)));
+struct point { int x, y; } origin;
+static T dist(struct point a) { return a.x * a.x; }
+"""
+    gen = GnuCGenerator()
+    expected = GnuCParser().parse(src)
+    ast = GnuCParser(node_factory=compact).parse(src)
+    assert gen.visit(ast) == gen.visit(expected)
+
+    decl = ast.ext[1]
+    assert isinstance(decl, CompactNode) and isinstance(decl, c_ast.Decl)
+    assert not hasattr(decl, "__dict__")
+    assert ast.ext[0].type.attributes is not None
+
+    restored = pickle.loads(pickle.dumps(ast, -1))
+    assert isinstance(restored.ext[2], CompactNode)
+    assert gen.visit(restored) == gen.visit(expected)
+
+    ast = GnuCParser(node_factory=compact, skip_function_bodies=True).parse(src)
+    body = ast.ext[2].body
+    assert isinstance(body, SkippedCompound) and isinstance(body, CompactNode)
+    assert src[body.start:body.end].startswith("{")
+
+    shared = c_ast.ID("x")
+    tree = compact(c_ast.BinaryOp("+", shared, shared))
+    assert tree.left is tree.right
+
+    # unnamed parameters are Typenames, which the parser gives a name
+    from pycparserext.walk import walk
+    ast = GnuCParser(node_factory=compact).parse("void f(int, char *);")
+    assert all(isinstance(node, CompactNode) for node in walk(ast.ext[0]))
+
+
+def test_binary_ast():
+    import pytest
+    from pycparser import c_ast
+    from pycparserext.ext_c_parser import GnuCParser, OpenCLCParser
+    from pycparserext.compact_ast import compact, CompactNode
+    from pycparserext import binary_ast
+
+    src = """
+typedef int T __attribute__((aligned(8)));
+struct point { int x, y; } origin;
+static T dist(struct point a) { int q[2] = {1, 2}; asm("nop"); return a.x; }
+"""
+    for kwargs in [{}, {"coord_mode": "lazy"}, {"node_factory": compact},
+            {"skip_function_bodies": True}]:
+        ast = GnuCParser(**kwargs).parse(src)
+        loaded = binary_ast.loads(binary_ast.dumps(ast))
+        assert show(loaded) == show(ast)
+        assert (isinstance(loaded.ext[1], CompactNode)
+                == ("node_factory" in kwargs))
+
+    ast = OpenCLCParser().parse(
+            "__kernel void k(__global float4 *a) { a[0] = (float4)(1.0f); }")
+    assert show(binary_ast.loads(binary_ast.dumps(ast))) == show(ast)
+
+    shared = c_ast.ID("x")
+    tree = binary_ast.loads(binary_ast.dumps(c_ast.BinaryOp("+", shared, shared)))
+    assert tree.left is tree.right
+
+    # prototypes with unnamed parameters, and compact and regular nodes
+    # side by side
+    ast = GnuCParser(node_factory=compact).parse("void f(int, char *);")
+    assert show(binary_ast.loads(binary_ast.dumps(ast))) == show(ast)
+    tree = c_ast.BinaryOp("+", compact(c_ast.ID("a")), c_ast.ID("b"))
+    loaded = binary_ast.loads(binary_ast.dumps(tree))
+    assert show(loaded) == show(tree)
+    assert isinstance(loaded.left, CompactNode)
+    assert not isinstance(loaded.right, CompactNode)
+
+    with pytest.raises(ValueError):
+        binary_ast.loads(b"not an AST")
+
+
+def test_share_subtrees():
+    from pycparserext.ext_c_parser import GnuCParser
+    from pycparserext.ext_c_generator import GnuCGenerator
+
+    src = """
+unsigned int a;
+extern int f(const char *, unsigned int) __attribute__((__nothrow__, __leaf__));
+extern int g(const char *) __attribute__((__nothrow__, __leaf__));
+int h(void) { return sizeof(unsigned int); }
+"""
+    gen = GnuCGenerator()
+    parser = GnuCParser(share_subtrees=True)
+    ast = parser.parse(src)
+    assert gen.visit(ast) == gen.visit(GnuCParser().parse(src))
+
+    a, f, g, h = ast.ext
+    f_params = f.type.args.params
+    g_params = g.type.args.params
+    assert a.type.type is f_params[1].type.type
+    assert parser.is_shared(a.type.type)
+    assert parser.is_shared(a.type.type.names)
+    assert not parser.is_shared(a.type)
+
+    # unnamed type declarations and attribute lists
+    assert f_params[0].type.type is g_params[0].type.type
+    assert f.type.attributes is g.type.attributes
+    assert f.type.attributes.coord is None
+    assert parser.is_shared(f.type.attributes.exprs[0])
+
+    # not across parses, so that the parser does not keep old trees
+    results = dict(parser.parse_many([
+        ("a.c", "unsigned long x; unsigned long y;"), ("b.c", "short z;")]))
+    x, y = results["a.c"].ext
+    assert x.type.type is y.type.type
+    assert not parser.is_shared(x.type.type)
+    x2 = parser.parse("unsigned long x;").ext[0]
+    assert x2.type.type is not x.type.type
+    assert x2.name == x.name
+
+    assert not GnuCParser().is_shared(a.type.type)
+
+
+def test_walk():
+    import sys
+    import pytest
+    from pycparser import c_ast
+    from pycparserext.ext_c_parser import GnuCParser
+    from pycparserext.compact_ast import compact
+    from pycparserext.walk import walk, iter_child_nodes
+
+    src = """
+typedef int T __attribute__((aligned(8)));
+extern int f(const char *, T) __attribute__((__nothrow__));
+int g(int x) {
+    __typeof__(x) y = f("", x) ? x + 1 : 2;
+    __asm__ ("nop" : "=r" (y) : "r" (x));
+    return y;
+}
+"""
+
+    def preorder(node):
+        yield node
+        for name, child in node.children():
+            for descendant in preorder(child):
+                yield descendant
+
+    def postorder(node):
+        for name, child in node.children():
+            for descendant in postorder(child):
+                yield descendant
+        yield node
+
+    ast = GnuCParser().parse(src)
+    for tree in [ast, compact(ast)]:
+        assert list(walk(tree)) == list(preorder(tree))
+        assert list(walk(tree, "post")) == list(postorder(tree))
+        assert list(walk(tree, node_class=(c_ast.ID, c_ast.Constant))) == [
+                node for node in preorder(tree)
+                if isinstance(node, (c_ast.ID, c_ast.Constant))]
+
+    func_def = ast.ext[2]
+    assert list(iter_child_nodes(func_def)) == [
+            child for name, child in func_def.children()]
+
+    # generic_visit of the generators goes through iter_child_nodes
+    from pycparserext.ext_c_generator import GnuCGenerator
+    gen = GnuCGenerator()
+    assert gen.generic_visit(func_def) == "".join(
+            gen.visit(child) for name, child in func_def.children())
+
+    # deeper than the recursion limit
+    expr = c_ast.ID("x")
+    for i in range(2 * sys.getrecursionlimit()):
+        expr = c_ast.UnaryOp("-", expr)
+    assert len(list(walk(expr, "post"))) == 2 * sys.getrecursionlimit() + 1
+
+    with pytest.raises(ValueError):
+        walk(ast, "in")
+
+
+def test_symbol_index():
+    import pytest
+    from pycparser import c_ast
+    from pycparserext.ext_c_parser import GnuCParser
+    from pycparserext.symbol_index import SymbolIndex, TAG, TYPEDEF
+
+    src = """
+struct point;
+typedef struct point { int x, y; } point_t;
+enum color { RED, GREEN = 2 };
+extern int count;
+int count = 3;
+struct node { struct inner { int a; } in; } first, last;
+int dist(struct local { int z; } *p);
+int dist(struct local *p) { enum { HIDDEN } h; return 0; }
+"""
+    ast = GnuCParser().parse(src)
+    index = SymbolIndex(ast)
+
+    assert index.names() == frozenset(
+            ["RED", "GREEN", "count", "first", "last", "dist"])
+    assert index.names(TAG) == frozenset(["point", "color", "node", "inner"])
+    assert index.names(TYPEDEF) == frozenset(["point_t"])
+
+    assert index.lookup("point", TAG).decls is not None
+    assert len(index.declarations("point", TAG)) == 2
+    assert len(index.declarations("node", TAG)) == 1
+    assert isinstance(index.lookup("dist"), c_ast.FuncDef)
+    assert index.lookup("count") is ast.ext[4]
+    assert isinstance(index.lookup("GREEN"), c_ast.Enumerator)
+    assert index.lookup("HIDDEN") is None
+
+    typedef = ast.ext.pop(1)
+    index.remove(typedef)
+    assert index.lookup("point_t", TYPEDEF) is None
+    assert index.declarations("point", TAG) == (ast.ext[0].type,)
+
+    ast.ext.append(typedef)
+    index.add(typedef)
+    assert index.lookup("point_t", TYPEDEF) is typedef
+    assert index.lookup("point", TAG).decls is not None
+
+    with pytest.raises(ValueError):
+        index.lookup("point", "label")
 
 
 
@@ -1,6 +1,8 @@
 import pycparser
 from pycparserext.ext_c_parser import OpenCLCParser
+from pycparserext.registry import get_parser
 from pycparserext.ext_c_generator import OpenCLCGenerator
+from pycparserext.walk import iter_child_nodes
 import types
 import re #For pattern matching preprocessor lines
 import os #For getting the ACE_OCL_INCLUDES envvar.
@@ -9,8 +11,10 @@ import os #For getting the ACE_OCL_INCLUDES envvar.
 #Checker
 ################################################################################
 class TypeChecker(object):
-    def __init__(self):
-        self.parser = OpenCLCParser()
+    def __init__(self, parse_cache=None):
+        """parse_cache = a pycparserext.parse_cache.ParseCache, optional."""
+        self.parse_cache = parse_cache
+        self.parser = get_parser(OpenCLCParser, parse_cache=parse_cache)
     
     def get_ast(self, code):
         ast = self.parser.parse(code)
@@ -20,13 +24,13 @@ class TypeChecker(object):
         ast.body.append(stmt_ast)
 
     def check_ast(self, ast, context):
-        tc = OpenCLTypeChecker(context) #create checker w/ ctx
+        tc = OpenCLTypeChecker(context, self.parse_cache) #create checker w/ ctx
         return tc.visit(ast)
     
     def check(self, code, context):
         """Initiates a check, and throws an error on failure."""
         ast = self.parser.parse(code)
-        tc = OpenCLTypeChecker(context) #create checker w/ new ctx
+        tc = OpenCLTypeChecker(context, self.parse_cache) #create checker w/ new ctx
         return tc.visit(ast)
 
 ################################################################################
@@ -1655,8 +1659,11 @@ class OpenCLTypeChecker(pycparser.c_ast.NodeVisitor):
         tc.visit(node) 
     """
     
-    def __init__(self, context=Context()):
-        """context = a pycparserext.typechecker.Context object."""
+    def __init__(self, context=Context(), parse_cache=None):
+        """context = a pycparserext.typechecker.Context object.
+        parse_cache = a pycparserext.parse_cache.ParseCache for included
+        headers, optional."""
+        self.parse_cache = parse_cache
         self._g = Context()                                                     #To get auto-complete in my IDE... TODO remove.
         self._g = context
         
@@ -1665,7 +1672,7 @@ class OpenCLTypeChecker(pycparser.c_ast.NodeVisitor):
         raise TargetTypeCheckException("visit_%s undefined" % 
                                        node.__class__.__name__, node)
     def visit_children(self, node):
-        for c_name, c in node.children():
+        for c in iter_child_nodes(node):
             self.visit(c)
 
     def visit_FileAST(self, node):
@@ -2083,7 +2090,7 @@ class OpenCLTypeChecker(pycparser.c_ast.NodeVisitor):
                 for line in f:
                     header_code = "%s%s" % (header_code,line)
                 #Typecheck the header file, adding to this context.
-                tc = TypeChecker()
+                tc = TypeChecker(parse_cache=self.parse_cache)
                 tc_Context = self._g
                 tc.check(header_code, tc_Context)
                 break     